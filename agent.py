@@ -1,35 +1,30 @@
 #!/usr/bin/env python3
 
+import argparse
+import json
 import os
-from pathlib import Path
-from typing import List, Optional, Dict, Any
-from uuid import uuid4
-from PIL import Image
-import yaml
+import time
+from concurrent.futures import Executor, Future, ThreadPoolExecutor
+from typing import TYPE_CHECKING, Callable, List, Optional, Dict, Any, Tuple
+import checkpoint
+import config
 import tool
+import context
+import imagestore
+import ratelimit
+import screenshots
+import tracing
 
-# anthropic import
-from anthropic import Anthropic, APIError
-from anthropic.types.beta import (
-    BetaMessage,
-    BetaMessageParam,
-    BetaToolResultBlockParam,
-)
+# the anthropic sdk takes about a second to import, it is loaded when a client
+# is made or a session starts
+if TYPE_CHECKING:
+    from anthropic.types.beta import BetaMessage, BetaMessageParam
 
-## CONFIG
-CONFIG_PATH = "config.yml"
-with open(CONFIG_PATH) as f:
-    dict = yaml.safe_load(f)
-
-ANTHROPIC_API_KEY = os.getenv("ANTHROPIC_API_KEY", dict["anthropic_api_key"])
 MODEL_NAME = "claude-3-5-sonnet-20241022"
 COMPUTER_USE_BETA_FLAG = "computer-use-2024-10-22"
 PROMPT_CACHING_BETA_FLAG = "prompt-caching-2024-07-31"
 
-DISPLAY_WIDTH = 3456 
-DISPLAY_HEIGHT = 2234
-
-def print_conversation(conversation: List[BetaMessageParam]):
+def print_conversation(conversation: List["BetaMessageParam"]):
     for msg in conversation:
         for content in msg['content']:
             if content['type'] == 'text':
@@ -39,72 +34,72 @@ def print_conversation(conversation: List[BetaMessageParam]):
             else:
                 print(f"unknown content type: {content['type']}")
 
-def trim_conversation(conversation: List[BetaMessageParam], keep_imgs: int = 5) -> List[BetaMessageParam]:
-    image_positions = []
-
-   # some images are nested in tool_result content
-    for msg_idx, msg in enumerate(conversation):
-        for content_idx, content in enumerate(msg['content']):
-            if content['type'] == "image":
-                image_positions.append((msg_idx, content_idx))
-            elif content['type'] == "tool_result":
-                
-                if isinstance(content.get('content'), list):
-                    for nested_content in content['content']:
-                        if nested_content.get('type') == "image":
-                            image_positions.append((msg_idx, content_idx))
-                            break  
-    
-    images_to_keep = set(tuple(pos) for pos in image_positions[-keep_imgs:])
-    
-    trimmed_conversation = []
-    
-    for msg_idx, msg in enumerate(conversation):
-        new_content = []
-        
-        for content_idx, content in enumerate(msg['content']):
-            position = (msg_idx, content_idx)
-            if content['type'] in ["text", "tool_use"]:
-                new_content.append(content)
-            elif content['type'] == "image" and position in images_to_keep:
-                new_content.append(content)
-            elif content['type'] == "tool_result":
-                if position in images_to_keep:
-                    new_content.append(content)
-                else:
-                    # remove images from tool_result content
-                    if isinstance(content.get('content'), list):
-                        filtered_content = [
-                            item for item in content['content'] 
-                            if item.get('type') != "image"
-                        ]
-                        if filtered_content:  # Only add if there's remaining content
-                            new_content_item = content.copy()
-                            new_content_item['content'] = filtered_content
-                            new_content.append(new_content_item)
-                    else:
-                        new_content.append(content)
-        
-        if new_content:
-            new_msg = msg.copy()
-            new_msg['content'] = new_content
-            trimmed_conversation.append(new_msg)
-    
-    return trimmed_conversation
+# history is kept under a token budget and trimmed in chunks (see context.py),
+# so between trims earlier messages stay byte-identical and consecutive turns
+# share a cached prefix
+CONTEXT_BUDGET = context.DEFAULT_BUDGET
+# stream responses and start each action as soon as its tool_use is complete
+STREAM = os.getenv("AGENT_STREAM", "") == "1"
+# per-turn timings and token counts are appended here as JSON lines when set
+TRACE_PATH = os.getenv("AGENT_TRACE_PATH")
+# when set, every screenshot sent is also written here, capped by file count and/or bytes
+SCREENSHOT_DIR = os.getenv("AGENT_SCREENSHOT_DIR")
+SCREENSHOT_MAX_FILES = int(os.getenv("AGENT_SCREENSHOT_MAX_FILES", screenshots.DEFAULT_MAX_FILES))
+SCREENSHOT_MAX_BYTES = int(os.environ["AGENT_SCREENSHOT_MAX_BYTES"]) if os.getenv("AGENT_SCREENSHOT_MAX_BYTES") else None
+# checkpoint directory for the command line (see checkpoint.py), run_agent_loop
+# only checkpoints when given a directory so sessions never share one by accident
+CHECKPOINT_DIR = os.getenv("AGENT_CHECKPOINT_DIR", checkpoint.DEFAULT_CHECKPOINT_DIR)
+# cache breakpoints on recent user turns, the system block uses the fourth
+CACHE_BREAKPOINTS = 3
+
+def add_cache_breakpoints(conversation: List["BetaMessageParam"], breakpoints: int = CACHE_BREAKPOINTS) -> None:
+    # moves cache_control to the last block of the most recent user turns, so the
+    # next request can read everything up to the previous turn from the cache
+    remaining = breakpoints
+    for msg in reversed(conversation):
+        if msg["role"] != "user" or not isinstance(msg["content"], list):
+            continue
+        for content in msg["content"]:
+            content.pop("cache_control", None)
+        if remaining > 0 and msg["content"]:
+            msg["content"][-1]["cache_control"] = {"type": "ephemeral"}
+            remaining -= 1
+
+def report_usage(usage: Any, totals: Dict[str, int]) -> None:
+    fields = ["input_tokens", "output_tokens", "cache_read_input_tokens", "cache_creation_input_tokens"]
+    for field in fields:
+        totals[field] = totals.get(field, 0) + (getattr(usage, field, None) or 0)
+
+    cached = totals["cache_read_input_tokens"]
+    prompt = totals["input_tokens"] + cached + totals["cache_creation_input_tokens"]
+    hit_rate = cached / prompt if prompt else 0.0
+    print(f"usage: in={usage.input_tokens} out={usage.output_tokens} "
+          f"cache_read={usage.cache_read_input_tokens or 0} cache_write={usage.cache_creation_input_tokens or 0} "
+          f"(session cache hit rate {hit_rate:.0%})")
 
 # computer tool
-def get_computer_tool() -> Dict[str, Any]:
+def get_computer_tool(computer: Optional[tool.Computer] = None) -> Dict[str, Any]:
+    computer = computer or tool.get_computer()
+    width, height = computer.scaler.api_size
     return {
         "type": "computer_20241022",
         "name": "computer",
-        "display_width_px": DISPLAY_WIDTH,
-        "display_height_px": DISPLAY_HEIGHT,
-        "display_number": None, 
+        "display_width_px": width,
+        "display_height_px": height,
+        "display_number": computer.display_number,
     }
 
-# agent loop
-def run_agent_loop(user_instructions: str) -> None:
-    system_prompt_text = """you are an assistant with access to a mac desktop environment via the 'computer' tool.\n"
+# retries and rate limits are handled by the wrapper, shared across sessions (see ratelimit.py)
+# the api key comes from cfg, or config.yml / ANTHROPIC_API_KEY when not given
+def make_client(cfg: Optional[config.Config] = None) -> ratelimit.RateLimitedClient:
+    from anthropic import Anthropic
+    cfg = cfg or config.load_config()
+    return ratelimit.RateLimitedClient(Anthropic(api_key=cfg.anthropic_api_key, max_retries=0))
+
+def ask_user_input() -> str:
+    return input("\nYou: ").strip()
+
+SYSTEM_PROMPT_TEXT = """you are an assistant with access to a mac desktop environment via the 'computer' tool.\n"
         "actions:\n"
         "  - key: press a key or chord.\n"
         "  - type: type a string of text.\n"
@@ -116,103 +111,352 @@ def run_agent_loop(user_instructions: str) -> None:
         "  - middle_click: middle-click at cursor.\n"
         "  - double_click: double-click at cursor.\n"
         "  - screenshot: take a screenshot.\n"
-        "  - scroll: scroll a pixel amount, can be positive or negative.\n"
+        "  - zoom: capture region [x0, y0, x1, y1] at full detail, or without region the area around the cursor.\n"
+        "    cheaper than a screenshot when only one field or button needs checking.\n"
+        "  - scroll: scroll a pixel amount given in text, positive scrolls down. optionally pass a coordinate to scroll at,\n"
+        "    or scroll_direction (up/down/left/right) with scroll_amount in wheel clicks instead of text.\n"
         "1) follow instructions.\n"
         "2) if a step fails, adapt.\n"
         "3) provide text explanations as you go.\n"
-        "4) always verify success with a screenshot.\n"""
-
-    system_prompt = (system_prompt_text + "\n" + "USER INSTRUCTIONS: " + user_instructions)
-
-    conversation: List[BetaMessageParam] = [
-        {
-            "role": "user",
-            "content": [{"type": "text", "text": "Follow the given instructions."}],
-        }
-    ]
-
-    anthro = Anthropic(api_key=ANTHROPIC_API_KEY)
-    beta_flags = [COMPUTER_USE_BETA_FLAG, PROMPT_CACHING_BETA_FLAG]
-
-    while True:
-        # attempt API call
-        conversation = trim_conversation(conversation)
-        # print_conversation(conversation)
-        try:
-            system_block = {
-                "type": "text",
-                "text": system_prompt,
-                "cache_control": {"type": "ephemeral"},
-            }
-            response = anthro.beta.messages.create(
-                model=MODEL_NAME,
-                messages=conversation,
-                system=[system_block],
-                tools=[get_computer_tool()],
-                max_tokens=1024,
-                betas=beta_flags,
-            )
-            
-        except APIError as e:
-            print("api error:", e)
-            return
-
-        # add to conversation
-        msg_obj: BetaMessage = response
-        conversation.append({"role": "assistant", "content": msg_obj.model_dump()["content"],})
-
-        # find tool use
-        tool_uses = []
-        for block in response.content:
-            if block.type == "tool_use":
-                tool_uses.append(block)
-            elif block.type == "text":
-                print(block.text)
-
-        # user interaction
-        if not tool_uses:
-            final_text_parts = [block.text for block in msg_obj.content if block.type == "text"]
-            print("===== question from claude =====")
-            # print("\n".join(final_text_parts))
-
-            # ask user if they want to continue or exit
-            user_input = input("\nYou: ").strip()
-            if user_input.lower() in {"exit", "quit"}:
-                print("exiting the conversation.")
-                break
-
-            conversation.append({
+        "4) always verify success with a screenshot, or a zoom when only one area matters.\n"""
+
+def build_system_block(user_instructions: str) -> Dict[str, Any]:
+    return {
+        "type": "text",
+        "text": SYSTEM_PROMPT_TEXT + "\n" + "USER INSTRUCTIONS: " + user_instructions,
+        "cache_control": {"type": "ephemeral"},
+    }
+
+def start_screenshot_log(computer: tool.Computer) -> None:
+    if computer.screenshots is None and SCREENSHOT_DIR:
+        computer.screenshots = screenshots.ScreenshotRing(SCREENSHOT_DIR, SCREENSHOT_MAX_FILES, SCREENSHOT_MAX_BYTES)
+    if computer.screenshots is not None:
+        computer.screenshots.new_session()
+
+def new_history(images: Optional[imagestore.ImageStore] = None) -> context.ContextManager:
+    history = context.ContextManager(CONTEXT_BUDGET, images=images)
+    history.append({
+        "role": "user",
+        "content": [{"type": "text", "text": "Follow the given instructions."}],
+    })
+    return history
+
+# trims the history and builds the arguments for messages.create
+def request_params(history: context.ContextManager, system_block: Dict[str, Any], computer: tool.Computer,
+                   tracer: tracing.Tracer) -> Dict[str, Any]:
+    with tracer.phase("context"):
+        conversation = history.fit()
+        add_cache_breakpoints(conversation)
+    # images are referenced by id in the history, base64 only exists in the payload
+    resolved_bytes = computer.images.stats["resolved_bytes"]
+    with tracer.phase("payload"):
+        payload = computer.images.resolve(conversation)
+    tracer.add_bytes("request", len(json.dumps(conversation)) + computer.images.stats["resolved_bytes"] - resolved_bytes)
+    # print_conversation(conversation)
+    return {
+        "model": MODEL_NAME,
+        "messages": payload,
+        "system": [system_block],
+        "tools": [get_computer_tool(computer)],
+        "max_tokens": 1024,
+        "betas": [COMPUTER_USE_BETA_FLAG, PROMPT_CACHING_BETA_FLAG],
+    }
+
+# adds the response to the history, prints its text and returns its tool uses
+def record_response(response: "BetaMessage", history: context.ContextManager, usage_totals: Dict[str, int],
+                    tracer: tracing.Tracer, print_text: bool = True) -> List[Any]:
+    report_usage(response.usage, usage_totals)
+    tracer.add_usage(response.usage)
+
+    history.append({"role": "assistant", "content": response.model_dump()["content"],})
+
+    tool_uses = []
+    for block in response.content:
+        if block.type == "tool_use":
+            tool_uses.append(block)
+        elif block.type == "text" and print_text:
+            print(block.text)
+    return tool_uses
+
+# streams one response, printing text as it arrives and handing each computer
+# tool_use to a worker thread as soon as its input is complete, while the rest
+# of the response is still streaming. returns the message and the tool results
+def stream_response(anthro: Any, params: Dict[str, Any], computer: tool.Computer,
+                    tracer: tracing.Tracer) -> Tuple["BetaMessage", List[Dict[str, Any]]]:
+    batch = tool.ActionBatch(computer)
+    pending: List[Any] = []
+    printed = False
+    with ThreadPoolExecutor(max_workers=1) as worker:
+        with tracer.phase("api"):
+            with anthro.beta.messages.stream(**params) as stream:
+                for event in stream:
+                    if event.type == "text":
+                        print(event.text, end="", flush=True)
+                        printed = True
+                    elif event.type == "content_block_stop" and event.content_block.type == "tool_use":
+                        block = event.content_block
+                        if block.name == "computer":
+                            pending.append(worker.submit(batch.run, tool_use_input(block)))
+                        else:
+                            pending.append(unknown_tool_result(block))
+                response = stream.get_final_message()
+        if printed:
+            print()
+        tool_result_blocks = [item.result() if isinstance(item, Future) else item for item in pending]
+    batch.finish()
+    return response, tool_result_blocks
+
+def tool_use_input(tool_use_block: Any) -> Dict[str, Any]:
+    # a copy, so the id does not leak into the assistant message sent back to the api
+    return {**tool_use_block.input, "id": tool_use_block.id}
+
+def unknown_tool_result(tool_use_block: Any) -> Dict[str, Any]:
+    return {
+        "type": "tool_result",
+        "tool_use_id": tool_use_block.id,
+        "content": [{"type": "text", "text": f"unknown tool: {tool_use_block.name}"}],
+        "is_error": True,
+    }
+
+def response_text(response: "BetaMessage") -> str:
+    return "\n".join(block.text for block in response.content if block.type == "text")
+
+# returns why a session has to stop early, None while it is within its limits
+def check_limits(turns: int, started: float, max_turns: Optional[int], timeout: Optional[float]) -> Optional[str]:
+    if max_turns is not None and turns >= max_turns:
+        return "max_turns"
+    if timeout is not None and time.monotonic() - started > timeout:
+        return "timeout"
+    return None
+
+def user_reply(history: context.ContextManager, user_input: str) -> bool:
+    # returns False when the user wants to stop
+    if user_input.lower() in {"exit", "quit"}:
+        print("exiting the conversation.")
+        return False
+    history.append({
+        "role": "user",
+        "content": [
+            {"type": "text", "text": user_input}
+        ],
+    })
+    return True
+
+# agent loop, returns True when the session ended normally and False on an api error
+# client and ask_user can be swapped out, e.g. for recorded sessions (see replay.py)
+# with stream=True, actions start while the response is still streaming
+# max_turns and timeout (seconds, checked between requests) end the session early;
+# status, when given, is filled with the turn count, the stop reason and the
+# text of the last response (see batch.py)
+# with checkpoint_dir the session is saved after every turn, and resume=True
+# continues the unfinished session saved there (its instructions win over
+# user_instructions) instead of starting a new one
+def run_agent_loop(user_instructions: str, computer: Optional[tool.Computer] = None,
+                   trace_path: Optional[str] = TRACE_PATH, client: Optional[Any] = None,
+                   ask_user: Callable[[], str] = ask_user_input, stream: bool = STREAM,
+                   max_turns: Optional[int] = None, timeout: Optional[float] = None,
+                   status: Optional[Dict[str, Any]] = None,
+                   checkpoint_dir: Optional[str] = None, resume: bool = False) -> bool:
+    from anthropic import APIError
+    status = status if status is not None else {}
+    status.update(turns=0, stop=None, final_text="")
+    started = time.monotonic()
+    computer = computer or tool.get_computer()
+    computer.images = imagestore.ImageStore()
+    # a new conversation has not been sent any frame yet
+    computer.differ.reset()
+    history = new_history(computer.images)
+    usage_totals: Dict[str, int] = {}
+
+    saver = checkpoint.Checkpointer(checkpoint_dir) if checkpoint_dir else None
+    state = saver.load() if saver and resume else None
+    if state and state["finished"]:
+        print(f"the session in {checkpoint_dir} already finished, starting a new one")
+        state = None
+    if state:
+        user_instructions = state["instructions"]
+        saver.restore(state, history, computer.images)
+        status.update(turns=state["turns"], final_text=state["final_text"])
+        usage_totals.update(state["usage"])
+        print(f"resuming from {checkpoint_dir} after turn {state['turns']}")
+    elif saver:
+        saver.reset()
+        saver.save(user_instructions, history, computer.images, 0)
+    system_block = build_system_block(user_instructions)
+    start_screenshot_log(computer)
+
+    def save(finished: bool = False) -> None:
+        if saver:
+            saver.save(user_instructions, history, computer.images, status["turns"], usage_totals,
+                       finished, status["final_text"])
+
+    anthro = client or make_client()
+
+    tracer = tracing.Tracer(trace_path)
+    computer.tracer = tracer
+
+    try:
+        while True:
+            limit = check_limits(status["turns"], started, max_turns, timeout)
+            if limit:
+                print(f"stopping: {limit.replace('_', ' ')} reached after {status['turns']} turns")
+                status["stop"] = limit
+                return False
+
+            # attempt API call
+            params = request_params(history, system_block, computer, tracer)
+            try:
+                if stream:
+                    response, streamed_results = stream_response(anthro, params, computer, tracer)
+                else:
+                    with tracer.phase("api"):
+                        response = anthro.beta.messages.create(**params)
+            except APIError as e:
+                print("api error:", e)
+                status["stop"] = "api_error"
+                return False
+
+            status["turns"] += 1
+            tool_uses = record_response(response, history, usage_totals, tracer, print_text=not stream)
+            status["final_text"] = response_text(response)
+
+            # user interaction
+            if not tool_uses:
+                print("===== question from claude =====")
+                # ask user if they want to continue or exit
+                if not user_reply(history, ask_user()):
+                    status["stop"] = "exit"
+                    save(finished=True)
+                    return True
+                save()
+                tracer.end_turn()
+                continue
+
+            # if there are tool uses, run them back to back with one trailing screenshot
+            if stream:
+                tool_result_blocks = streamed_results
+            else:
+                tool_result_blocks = []
+                batch = tool.ActionBatch(computer)
+                for tool_use_block in tool_uses:
+                    if tool_use_block.name == "computer":
+                        tool_result_blocks.append(batch.run(tool_use_input(tool_use_block)))
+                    else:
+                        tool_result_blocks.append(unknown_tool_result(tool_use_block))
+                batch.finish()
+
+            history.append({
                 "role": "user",
-                "content": [
-                    {"type": "text", "text": user_input}
-                ],
+                "content": tool_result_blocks,
             })
-            continue
+            save()
+            tracer.end_turn()
+    finally:
+        tracer.close()
+        print(tracer.summary())
+        print(computer.images.report())
+        if isinstance(anthro, ratelimit.RateLimitedClient):
+            print(anthro.summary())
 
-        # if there are tool uses, handle them
-        tool_result_blocks = []
-        for tool_use_block in tool_uses:
-            if tool_use_block.name == "computer":
-                tool_use_input = tool_use_block.input
-                tool_use_input["id"] = tool_use_block.id
-                tool_result = tool.handle_computer_tool_use(tool_use_input)
-                tool_result_blocks.append(tool_result)
-            else:
-                tool_result_blocks.append({
-                    "type": "tool_result",
-                    "tool_use_id": tool_use_block.id,
-                    "content": [{"type": "text", "text": f"unknown tool: {tool_use_block.name}"}],
-                    "is_error": True,
-                })
-
-        conversation.append({
-            "role": "user",
-            "content": tool_result_blocks,
-        })
+def make_async_client(cfg: Optional[config.Config] = None) -> ratelimit.AsyncRateLimitedClient:
+    from anthropic import AsyncAnthropic
+    cfg = cfg or config.load_config()
+    return ratelimit.AsyncRateLimitedClient(AsyncAnthropic(api_key=cfg.anthropic_api_key, max_retries=0))
+
+# async agent loop: model calls are awaited on the event loop while input
+# injection, capture and encoding run in an executor, so many sessions (each
+# with its own computer) can share one loop. tool results are the same as
+# in run_agent_loop
+async def run_agent_loop_async(user_instructions: str, computer: Optional[tool.Computer] = None,
+                               trace_path: Optional[str] = TRACE_PATH, client: Optional[Any] = None,
+                               ask_user: Callable[[], str] = ask_user_input,
+                               executor: Optional[Executor] = None) -> bool:
+    import asyncio
+    from anthropic import APIError
+    system_block = build_system_block(user_instructions)
+    computer = computer or tool.get_computer()
+    computer.images = imagestore.ImageStore()
+    # a new conversation has not been sent any frame yet
+    computer.differ.reset()
+    history = new_history(computer.images)
+    start_screenshot_log(computer)
+
+    anthro = client or make_async_client()
+    usage_totals: Dict[str, int] = {}
+    loop = asyncio.get_running_loop()
+
+    tracer = tracing.Tracer(trace_path)
+    computer.tracer = tracer
+
+    # the scaler may capture a frame the first time, keep that off the loop too
+    await loop.run_in_executor(executor, lambda: computer.scaler)
+
+    try:
+        while True:
+            params = request_params(history, system_block, computer, tracer)
+            try:
+                with tracer.phase("api"):
+                    response = await anthro.beta.messages.create(**params)
+            except APIError as e:
+                print("api error:", e)
+                return False
+
+            tool_uses = record_response(response, history, usage_totals, tracer)
+
+            if not tool_uses:
+                print("===== question from claude =====")
+                if not user_reply(history, await loop.run_in_executor(executor, ask_user)):
+                    return True
+                tracer.end_turn()
+                continue
+
+            tool_result_blocks = []
+            batch = tool.ActionBatch(computer)
+            for tool_use_block in tool_uses:
+                if tool_use_block.name == "computer":
+                    tool_result_blocks.append(await loop.run_in_executor(executor, batch.run, tool_use_input(tool_use_block)))
+                else:
+                    tool_result_blocks.append(unknown_tool_result(tool_use_block))
+            await loop.run_in_executor(executor, batch.finish)
+
+            history.append({
+                "role": "user",
+                "content": tool_result_blocks,
+            })
+            tracer.end_turn()
+    finally:
+        tracer.close()
+        print(tracer.summary())
+        print(computer.images.report())
+        if isinstance(anthro, ratelimit.RateLimitedClient):
+            print(anthro.summary())
+
+async def run_sessions_async(sessions: List[Tuple[str, tool.Computer]], **kwargs: Any) -> List[Any]:
+    # one event loop and one async client for all sessions
+    import asyncio
+    client = kwargs.pop("client", None) or make_async_client()
+    return await asyncio.gather(
+        *(run_agent_loop_async(instructions, computer, client=client, **kwargs) for instructions, computer in sessions),
+        return_exceptions=True,
+    )
 
 if __name__ == "__main__":
-    user_input = input("\nYou: ").strip()
+    parser = argparse.ArgumentParser(description="run the computer use agent on this desktop")
+    parser.add_argument("instructions", nargs="?", help="task instructions, asked for when omitted")
+    parser.add_argument("--config", help=f"YAML file with anthropic_api_key (default {config.DEFAULT_CONFIG_PATH})")
+    parser.add_argument("--stream", action="store_true", default=STREAM, help="stream responses")
+    parser.add_argument("--trace", default=TRACE_PATH, help="append per-turn timings to this JSON lines file")
+    parser.add_argument("--checkpoint", default=CHECKPOINT_DIR,
+                        help="directory the session is saved to after every turn")
+    parser.add_argument("--resume", action="store_true", help="continue the unfinished session in the checkpoint directory")
+    args = parser.parse_args()
+
+    cfg = config.load_config(args.config)
+    saved = checkpoint.Checkpointer(args.checkpoint).load() if args.resume else None
+    resumable = saved is not None and not saved["finished"]
+    user_input = "" if resumable else (args.instructions or input("\nYou: ").strip())
     if user_input.lower() in {"exit", "quit"}:
         print("exiting the conversation.")
     else:
-        run_agent_loop(user_input)
\ No newline at end of file
+        run_agent_loop(user_input, trace_path=args.trace, client=make_client(cfg), stream=args.stream,
+                       checkpoint_dir=args.checkpoint, resume=args.resume)
\ No newline at end of file
@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+
+import argparse
+import csv
+import json
+import re
+import time
+import traceback
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+import tool
+
+# headless batch mode: a task is a list of instruction templates (steps) run in
+# order for every parameter set, e.g. {"row": 51}. nobody is at the terminal,
+# so the model is told to end with a completion marker, which decides success
+# or failure; a task stops at its first failed step. every finished task is
+# appended to a JSON lines results file straight away
+
+DEFAULT_RESULTS = "results.jsonl"
+# caps per task (all of its steps together)
+DEFAULT_MAX_TURNS = 60
+DEFAULT_TIMEOUT = 900.0
+SUCCESS_MARKER = "TASK COMPLETE"
+FAILURE_MARKER = "TASK FAILED"
+COMPLETION_PROMPT = (
+    "\n\nYou are running unattended and nobody can answer questions. "
+    f"When every step is done and verified, end your final message with {SUCCESS_MARKER}. "
+    f"If the task cannot be finished, end your final message with {FAILURE_MARKER}: followed by the reason."
+)
+# final message text kept in the results file
+FINAL_TEXT_CHARS = 500
+
+def expand(template: str, params: Dict[str, Any]) -> str:
+    try:
+        return template.format_map(params)
+    except KeyError as e:
+        raise ValueError(f"template needs parameter {e.args[0]!r}, got {sorted(params)}")
+
+def detect_outcome(final_text: str) -> Tuple[str, str]:
+    # returns (status, reason), the last marker in the final message wins
+    markers = list(re.finditer(rf"({re.escape(SUCCESS_MARKER)}|{re.escape(FAILURE_MARKER)}):?", final_text))
+    if not markers:
+        return "failure", "no completion marker in the final message"
+    last = markers[-1]
+    if last.group(1) == SUCCESS_MARKER:
+        return "success", ""
+    rest = final_text[last.end():].strip()
+    return "failure", rest.splitlines()[0] if rest else "reported failure"
+
+def parse_rows(spec: str) -> List[int]:
+    # "51-53,60" -> [51, 52, 53, 60]
+    rows = []
+    for part in spec.split(","):
+        part = part.strip()
+        if "-" in part:
+            first, last = (int(value) for value in part.split("-", 1))
+            rows.extend(range(first, last + 1))
+        elif part:
+            rows.append(int(part))
+    return rows
+
+def load_params(path: str) -> List[Dict[str, Any]]:
+    # a csv file with a header row, or a json/yaml list of objects
+    if path.endswith(".csv"):
+        with open(path, newline="") as f:
+            return [dict(row) for row in csv.DictReader(f)]
+    import yaml
+    return yaml.safe_load(Path(path).read_text())
+
+def completed_params(results_path: str) -> List[Dict[str, Any]]:
+    path = Path(results_path)
+    if not path.exists():
+        return []
+    results = [json.loads(line) for line in path.read_text().splitlines() if line.strip()]
+    return [result["params"] for result in results if result.get("status") == "success"]
+
+def run_task(steps: List[str], params: Dict[str, Any], computer: Optional[tool.Computer] = None,
+             max_turns: Optional[int] = DEFAULT_MAX_TURNS, timeout: Optional[float] = DEFAULT_TIMEOUT,
+             **loop_kwargs: Any) -> Dict[str, Any]:
+    import agent
+    result: Dict[str, Any] = {"params": params, "status": "success", "reason": "", "turns": 0, "steps": [],
+                              "started": time.time()}
+    start = time.monotonic()
+    for idx, template in enumerate(steps):
+        status: Dict[str, Any] = {}
+        try:
+            agent.run_agent_loop(
+                expand(template, params) + COMPLETION_PROMPT, computer,
+                ask_user=lambda: "exit",
+                max_turns=None if max_turns is None else max(0, max_turns - result["turns"]),
+                timeout=None if timeout is None else max(0.0, timeout - (time.monotonic() - start)),
+                status=status, **loop_kwargs,
+            )
+            if status.get("stop") in ("max_turns", "timeout", "api_error"):
+                outcome, reason = status["stop"], f"stopped after {status['turns']} turns"
+            else:
+                outcome, reason = detect_outcome(status.get("final_text", ""))
+        except Exception as e:
+            outcome, reason = "error", f"{e}\n{traceback.format_exc()}"
+
+        result["turns"] += status.get("turns", 0)
+        result["steps"].append({"step": idx, "status": outcome, "reason": reason, "turns": status.get("turns", 0),
+                                "final_text": status.get("final_text", "")[-FINAL_TEXT_CHARS:]})
+        if outcome != "success":
+            result["status"], result["reason"] = outcome, f"step {idx}: {reason}"
+            break
+    result["duration"] = time.monotonic() - start
+    return result
+
+def run_batch(steps: List[str], param_sets: List[Dict[str, Any]], results_path: str = DEFAULT_RESULTS,
+              computer: Optional[tool.Computer] = None, skip_done: bool = False,
+              **task_kwargs: Any) -> List[Dict[str, Any]]:
+    done = completed_params(results_path) if skip_done else []
+    results = []
+    with open(results_path, "a") as f:
+        for idx, params in enumerate(param_sets):
+            if params in done:
+                print(f"[{idx + 1}/{len(param_sets)}] {params}: already done, skipped")
+                continue
+            result = run_task(steps, params, computer, **task_kwargs)
+            f.write(json.dumps(result) + "\n")
+            f.flush()
+            results.append(result)
+            reason = result["reason"].splitlines()[0] if result["reason"] else ""
+            print(f"[{idx + 1}/{len(param_sets)}] {params}: {result['status']} "
+                  f"({result['turns']} turns, {result['duration']:.0f}s) {reason}".rstrip())
+    succeeded = sum(result["status"] == "success" for result in results)
+    print(f"batch: {succeeded}/{len(results)} tasks succeeded, results in {results_path}")
+    return results
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="run instruction templates unattended over a list of parameters")
+    parser.add_argument("task", help="YAML file with 'steps' (instruction templates, e.g. 'You are in Row {row}') "
+                                     "and optionally 'params', 'max_turns' and 'timeout'")
+    parser.add_argument("--rows", help="shortcut for params [{row: N}], e.g. 51-60,72")
+    parser.add_argument("--params", help="csv, json or yaml file with one parameter set per row/item")
+    parser.add_argument("--results", default=DEFAULT_RESULTS, help="JSON lines file, one line per task")
+    parser.add_argument("--max-turns", type=int, help=f"model turns per task (default {DEFAULT_MAX_TURNS})")
+    parser.add_argument("--timeout", type=float, help=f"seconds per task (default {DEFAULT_TIMEOUT:.0f})")
+    parser.add_argument("--skip-done", action="store_true", help="skip parameter sets that already succeeded in the results file")
+    args = parser.parse_args()
+
+    import yaml
+    task = yaml.safe_load(Path(args.task).read_text())
+    steps = task["steps"] if "steps" in task else [task["template"]]
+    if args.rows:
+        param_sets = [{"row": row} for row in parse_rows(args.rows)]
+    elif args.params:
+        param_sets = load_params(args.params)
+    else:
+        param_sets = task.get("params") or [{}]
+
+    run_batch(steps, param_sets, args.results, skip_done=args.skip_done,
+              max_turns=args.max_turns or task.get("max_turns", DEFAULT_MAX_TURNS),
+              timeout=args.timeout or task.get("timeout", DEFAULT_TIMEOUT))
@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+
+import argparse
+import random
+import time
+from pathlib import Path
+from typing import Dict, List, Tuple
+from PIL import Image, ImageDraw
+
+import encoder
+import scaling
+
+# compares encode time and output size across formats on a corpus of screenshots:
+# python bench_encode.py [dir of png/jpg screenshots] [--repeat N]
+# without a directory a few synthetic screens are generated (spreadsheet, flat UI, photo)
+
+def synthetic_corpus(size: Tuple[int, int] = (2560, 1600)) -> Dict[str, Image.Image]:
+    rng = random.Random(0)
+    width, height = size
+
+    sheet = Image.new("RGB", size, "white")
+    draw = ImageDraw.Draw(sheet)
+    for y in range(0, height, 40):
+        draw.line([(0, y), (width, y)], fill=(210, 210, 210))
+        for x in range(0, width, 200):
+            draw.text((x + 8, y + 12), f"{rng.randint(0, 99999):>6}.{rng.randint(0, 99):02d}", fill="black")
+    for x in range(0, width, 200):
+        draw.line([(x, 0), (x, height)], fill=(210, 210, 210))
+
+    ui = Image.new("RGB", size, (236, 236, 236))
+    draw = ImageDraw.Draw(ui)
+    draw.rectangle([0, 0, width, 60], fill=(50, 60, 80))
+    for idx in range(12):
+        top = 100 + idx * 110
+        draw.rounded_rectangle([80, top, width - 80, top + 90], radius=12, fill="white", outline=(200, 200, 200))
+        draw.text((110, top + 35), f"settings item {idx}: lorem ipsum dolor sit amet", fill=(30, 30, 30))
+
+    photo = Image.effect_mandelbrot(size, (-2.0, -1.2, 1.0, 1.2), 100).convert("RGB")
+    photo = Image.merge("RGB", [photo.getchannel(0), photo.rotate(180).getchannel(0), photo.transpose(Image.Transpose.FLIP_LEFT_RIGHT).getchannel(0)])
+
+    return {"spreadsheet": sheet, "flat_ui": ui, "photo": photo}
+
+def load_corpus(path: str) -> Dict[str, Image.Image]:
+    files = sorted(p for p in Path(path).iterdir() if p.suffix.lower() in {".png", ".jpg", ".jpeg", ".webp"})
+    return {p.name: Image.open(p).convert("RGB") for p in files}
+
+def timed(fn, repeat: int) -> Tuple[float, bytes]:
+    best, data = float("inf"), b""
+    for _ in range(repeat):
+        start = time.perf_counter()
+        data = fn()
+        best = min(best, time.perf_counter() - start)
+    return best, data
+
+def bench(corpus: Dict[str, Image.Image], repeat: int, target: str) -> List[Tuple[str, str, float, int]]:
+    rows = []
+    for name, img in corpus.items():
+        size = scaling.fit_size(img.size, scaling.SCALE_TARGETS[target])
+        small = img.resize(size, Image.Resampling.BILINEAR, reducing_gap=2.0)
+        candidates = {
+            "jpeg q50 (old default)": lambda: encoder.encode_as(small, "jpeg", 50),
+            "png palette": lambda: encoder.encode_as(small.quantize(encoder.PALETTE_MAX_COLORS, Image.Quantize.FASTOCTREE), "png"),
+            "png gray": lambda: encoder.encode_as(small.convert("L"), "png"),
+        }
+        for quality in encoder.QUALITIES:
+            candidates[f"jpeg q{quality}"] = lambda quality=quality: encoder.encode_as(small, "jpeg", quality)
+            if "webp" in encoder.available_formats(["webp"]):
+                candidates[f"webp q{quality}"] = lambda quality=quality: encoder.encode_as(small, "webp", quality)
+        for label, fn in candidates.items():
+            seconds, data = timed(fn, repeat)
+            rows.append((name, label, seconds, len(data)))
+        # the adaptive encoder, including its resize
+        adaptive = encoder.Encoder()
+        seconds, data = timed(lambda: adaptive.encode(img, size)[0], repeat)
+        rows.append((name, f"adaptive -> {next(iter(adaptive.counts))}", seconds, len(data)))
+    return rows
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="benchmark screenshot encoding formats")
+    parser.add_argument("corpus", nargs="?", help="directory of sample screenshots, synthetic screens if omitted")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--target", default=scaling.DEFAULT_TARGET, choices=sorted(scaling.SCALE_TARGETS))
+    args = parser.parse_args()
+
+    corpus = load_corpus(args.corpus) if args.corpus else synthetic_corpus()
+    print(f"{'image':<20} {'encoding':<24} {'ms':>8} {'bytes':>9}")
+    for name, label, seconds, count in bench(corpus, args.repeat, args.target):
+        print(f"{name:<20} {label:<24} {seconds * 1000:>8.1f} {count:>9}")
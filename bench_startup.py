@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+from typing import Dict, List, Tuple
+
+# startup-time benchmark: imports each module in a fresh interpreter and reports
+# the wall time and which heavy dependencies came along. none of the modules
+# below should pull in the sdk, PIL or yaml just by being imported:
+# python bench_startup.py [--repeat N] [--max-ms MS]
+
+MODULES = ["tool", "agent", "batch", "runner", "trajectory", "inputs", "capture"]
+HEAVY = ["anthropic", "PIL", "yaml", "pyautogui", "Quartz", "Xlib"]
+REPEAT = 5
+
+def import_once(module: str) -> Tuple[float, Dict[str, int]]:
+    # returns the wall time and the cumulative import time (us) of each top-level package
+    here = os.path.dirname(os.path.abspath(__file__))
+    start = time.perf_counter()
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                          cwd=here, capture_output=True, text=True)
+    elapsed = time.perf_counter() - start
+    if proc.returncode != 0:
+        raise RuntimeError(f"importing {module} failed:\n{proc.stderr[-2000:]}")
+    packages: Dict[str, int] = {}
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = (part.strip() for part in line.split(":", 1)[1].split("|"))
+        if cumulative.isdigit() and not name.startswith(" "):
+            packages[name.split(".")[0]] = max(packages.get(name.split(".")[0], 0), int(cumulative))
+    return elapsed, packages
+
+def bench(modules: List[str], repeat: int) -> List[Tuple[str, float, float, List[str]]]:
+    rows = []
+    for module in modules:
+        times, imported = [], set()
+        for _ in range(repeat):
+            elapsed, packages = import_once(module)
+            times.append(elapsed)
+            imported |= {name for name in packages if name in HEAVY}
+        rows.append((module, statistics.median(times), min(times), sorted(imported)))
+    return rows
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="measure module import (startup) time")
+    parser.add_argument("modules", nargs="*", default=MODULES)
+    parser.add_argument("--repeat", type=int, default=REPEAT)
+    parser.add_argument("--max-ms", type=float, help="exit with an error when a median goes over this")
+    args = parser.parse_args()
+
+    interpreter = bench(["os"], args.repeat)[0][1]
+    rows = bench(args.modules, args.repeat)
+    print(f"bare interpreter: {interpreter * 1000:.0f} ms")
+    print(f"{'module':<12} {'median':>8} {'best':>8}  heavy imports")
+    slow = []
+    for module, median, best, heavy in rows:
+        print(f"{module:<12} {median * 1000:>6.0f}ms {best * 1000:>6.0f}ms  {', '.join(heavy) or '-'}")
+        if args.max_ms is not None and median * 1000 > args.max_ms:
+            slow.append(module)
+    if slow:
+        print(f"over {args.max_ms:.0f} ms: {', '.join(slow)}")
+        sys.exit(1)
@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+
+import os
+import sys
+from typing import TYPE_CHECKING, List, Optional, Tuple, Union
+
+# PIL is imported by the backends when they first make an image
+if TYPE_CHECKING:
+    from PIL import Image
+
+# screen capture backends: each returns the screen as an in-memory PIL image,
+# so frames go straight to the encoder without temp files or base64 hops
+
+class CaptureBackend:
+    # physical pixels per input (mouse) unit, e.g. 2.0 on a retina mac
+    scale_factor: float = 1.0
+
+    def capture(self) -> "Image.Image":
+        raise NotImplementedError
+
+    # cheap frame used for polling (e.g. settle detection), any resolution is fine
+    def capture_preview(self) -> "Image.Image":
+        return self.capture()
+
+    def size(self) -> Tuple[int, int]:
+        return self.capture().size
+
+class MacCapture(CaptureBackend):
+    # in-process capture through Quartz (pyobjc-framework-Quartz)
+    def __init__(self, display_id: Optional[int] = None):
+        import Quartz
+        self.Quartz = Quartz
+        self.display_id = display_id if display_id is not None else Quartz.CGMainDisplayID()
+
+        mode = Quartz.CGDisplayCopyDisplayMode(self.display_id)
+        self._size = (Quartz.CGDisplayModeGetPixelWidth(mode), Quartz.CGDisplayModeGetPixelHeight(mode))
+        self.scale_factor = self._size[0] / Quartz.CGDisplayModeGetWidth(mode)
+
+    def capture(self) -> "Image.Image":
+        return self._to_image(self.Quartz.CGDisplayCreateImage(self.display_id))
+
+    def capture_preview(self) -> "Image.Image":
+        # nominal resolution skips the retina backing scale, a quarter of the pixels
+        Q = self.Quartz
+        cg_img = Q.CGWindowListCreateImage(Q.CGDisplayBounds(self.display_id), Q.kCGWindowListOptionOnScreenOnly,
+                                           Q.kCGNullWindowID, Q.kCGWindowImageNominalResolution)
+        return self._to_image(cg_img)
+
+    def _to_image(self, cg_img) -> "Image.Image":
+        Q = self.Quartz
+        if cg_img is None:
+            raise RuntimeError("screen capture failed (is screen recording permission granted?)")
+
+        width = Q.CGImageGetWidth(cg_img)
+        height = Q.CGImageGetHeight(cg_img)
+        stride = Q.CGImageGetBytesPerRow(cg_img)
+        data = Q.CGDataProviderCopyData(Q.CGImageGetDataProvider(cg_img))
+        # quartz hands back premultiplied BGRA rows, possibly padded
+        from PIL import Image
+        return Image.frombuffer("RGB", (width, height), data, "raw", "BGRX", stride, 1)
+
+    def size(self) -> Tuple[int, int]:
+        return self._size
+
+class X11Capture(CaptureBackend):
+    # in-process capture through Pillow's XCB support, works with Xvfb
+    def __init__(self, display: Optional[str] = None):
+        self.display = display or os.environ.get("DISPLAY", ":0")
+        self._size = None
+
+    def capture(self) -> "Image.Image":
+        from PIL import ImageGrab
+        img = ImageGrab.grab(xdisplay=self.display)
+        self._size = img.size
+        return img
+
+    def size(self) -> Tuple[int, int]:
+        if self._size is None:
+            self.capture()
+        return self._size
+
+class FakeCapture(CaptureBackend):
+    # serves frames from memory, the last frame repeats once the list runs out
+    def __init__(self, frames: "Union[Image.Image, List[Image.Image], None]" = None, size: Tuple[int, int] = (1280, 800)):
+        from PIL import Image
+        if frames is None:
+            frames = [Image.new("RGB", size, "white")]
+        elif isinstance(frames, Image.Image):
+            frames = [frames]
+        self.frames = list(frames)
+        self.index = 0
+        self.captures = 0
+
+    def push(self, frame: "Image.Image") -> None:
+        self.frames.append(frame)
+
+    def capture(self) -> "Image.Image":
+        frame = self.frames[min(self.index, len(self.frames) - 1)]
+        self.index += 1
+        self.captures += 1
+        return frame
+
+    def size(self) -> Tuple[int, int]:
+        return self.frames[0].size
+
+def default_capture_backend(display: Optional[str] = None) -> CaptureBackend:
+    if sys.platform == "darwin":
+        return MacCapture()
+    return X11Capture(display)
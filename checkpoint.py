@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+
+import json
+import os
+import shutil
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import context
+import imagestore
+
+# session checkpoints: after every turn the conversation (with images as
+# references, see imagestore.py), the turn counter and the last screenshot
+# reference go to <dir>/session.json, and every referenced image is written
+# once to <dir>/images/<hash>. a run that dies can resume from the last turn
+# instead of repeating every model call
+
+DEFAULT_CHECKPOINT_DIR = "checkpoints"
+SESSION_FILE = "session.json"
+VERSION = 1
+RESUME_NOTE = ("[session resumed from a checkpoint, the screen may have changed since the last result. "
+               "take a screenshot before continuing]")
+
+def history_refs(messages: List[Dict[str, Any]]) -> Dict[str, str]:
+    # image id -> media type for every image the messages reference
+    refs = {}
+    for message in messages:
+        if isinstance(message.get("content"), list):
+            for block in message["content"]:
+                items = block["content"] if block.get("type") == "tool_result" and isinstance(block.get("content"), list) else [block]
+                for item in items:
+                    if imagestore.is_ref(item):
+                        refs[item["source"]["id"]] = item["source"]["media_type"]
+    return refs
+
+class Checkpointer:
+    def __init__(self, path: str = DEFAULT_CHECKPOINT_DIR):
+        self.dir = Path(path)
+        self.images_dir = self.dir / "images"
+        self._written = set()
+
+    def exists(self) -> bool:
+        return (self.dir / SESSION_FILE).exists()
+
+    def reset(self) -> None:
+        # a new session, images of the previous one are not needed any more
+        (self.dir / SESSION_FILE).unlink(missing_ok=True)
+        shutil.rmtree(self.images_dir, ignore_errors=True)
+        self._written = set()
+
+    def save(self, instructions: str, history: context.ContextManager, images: imagestore.ImageStore,
+             turns: int, usage: Optional[Dict[str, int]] = None, finished: bool = False, final_text: str = "") -> None:
+        self.images_dir.mkdir(parents=True, exist_ok=True)
+        snapshot = history.snapshot()
+        refs = history_refs(snapshot["messages"])
+        for key in refs:
+            if key not in self._written:
+                path = self.images_dir / key
+                if not path.exists():
+                    path.write_bytes(images.get(key))
+                self._written.add(key)
+        last_image = list(refs)[-1] if refs else None
+        state = {
+            "version": VERSION,
+            "instructions": instructions,
+            "turns": turns,
+            "finished": finished,
+            "final_text": final_text,
+            "last_image": last_image,
+            "usage": usage or {},
+            "context": snapshot,
+            "saved": time.time(),
+        }
+        # written to a temporary file first so a crash never leaves half a checkpoint
+        tmp = self.dir / (SESSION_FILE + ".tmp")
+        tmp.write_text(json.dumps(state))
+        os.replace(tmp, self.dir / SESSION_FILE)
+
+    def load(self) -> Optional[Dict[str, Any]]:
+        if not self.exists():
+            return None
+        state = json.loads((self.dir / SESSION_FILE).read_text())
+        if state.get("version") != VERSION:
+            raise ValueError(f"checkpoint {self.dir} has version {state.get('version')}, expected {VERSION}")
+        return state
+
+    def restore(self, state: Dict[str, Any], history: context.ContextManager, images: imagestore.ImageStore) -> None:
+        # refills the image store from disk (one reference per image block, as
+        # when the blocks were first made) and rebuilds the history
+        messages = state["context"]["messages"]
+        for message in messages:
+            if isinstance(message.get("content"), list):
+                for block in message["content"]:
+                    for key in imagestore.ref_ids(block):
+                        path = self.images_dir / key
+                        if not path.exists():
+                            raise ValueError(f"checkpoint {self.dir} is missing image {key}")
+                        images.put(path.read_bytes())
+        history.restore(state["context"])
+        self._written = set(history_refs(messages))
+        # actions after the last checkpoint may have run, so the model looks again first
+        last = history.entries[-1]
+        if last.message["role"] == "user":
+            history.tokens += last.replace_content(last.message["content"] + [{"type": "text", "text": RESUME_NOTE}])
@@ -0,0 +1,32 @@
+#!/usr/bin/env python3
+
+import os
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+# settings are loaded when a client is made (or explicitly, see agent.py's
+# command line), never at import time. ANTHROPIC_API_KEY in the environment
+# overrides the file, and the file is optional when it is set
+
+DEFAULT_CONFIG_PATH = "config.yml"
+
+class Config:
+    def __init__(self, anthropic_api_key: str, values: Optional[Dict[str, Any]] = None, path: Optional[str] = None):
+        self.anthropic_api_key = anthropic_api_key
+        # everything else the file holds
+        self.values = dict(values or {})
+        self.path = path
+
+    def get(self, key: str, default: Any = None) -> Any:
+        return self.values.get(key, default)
+
+def load_config(path: Optional[str] = None) -> Config:
+    path = path or os.getenv("AGENT_CONFIG", DEFAULT_CONFIG_PATH)
+    values: Dict[str, Any] = {}
+    if Path(path).exists():
+        import yaml
+        values = yaml.safe_load(Path(path).read_text()) or {}
+    api_key = os.getenv("ANTHROPIC_API_KEY") or values.get("anthropic_api_key")
+    if not api_key:
+        raise ValueError(f"no API key: set ANTHROPIC_API_KEY or anthropic_api_key in {path}")
+    return Config(api_key, values, path)
@@ -0,0 +1,203 @@
+#!/usr/bin/env python3
+
+import base64
+import binascii
+import io
+import json
+import math
+from typing import Any, Dict, List, Optional, Tuple
+import imagestore
+
+# token-budget context manager: estimates the cost of every block as messages
+# are appended and, once the history goes over budget, drops the oldest images
+# and then the oldest turns until it is back under a low-water mark. trimming
+# in one go (instead of a little every turn) keeps the cached prefix stable
+
+DEFAULT_BUDGET = 40000
+# after going over budget, trim down to this fraction of it
+LOW_WATER = 0.75
+# the most recent turns are never trimmed
+KEEP_RECENT_TURNS = 2
+
+CHARS_PER_TOKEN = 4
+PIXELS_PER_TOKEN = 750
+BLOCK_OVERHEAD = 5
+# omitted turns are summarised by the first line of their text, capped
+SUMMARY_LINES = 5
+SUMMARY_LINE_CHARS = 120
+# used when an image header cannot be read, roughly a WXGA screenshot
+DEFAULT_IMAGE_SIZE = (1280, 800)
+
+def estimate_text_tokens(text: str) -> int:
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+def estimate_image_tokens(width: int, height: int) -> int:
+    return math.ceil(width * height / PIXELS_PER_TOKEN)
+
+def image_size(block: Dict[str, Any]) -> Tuple[int, int]:
+    source = block.get("source", {})
+    if source.get("type") == imagestore.REF_TYPE and source.get("size"):
+        return tuple(source["size"])
+    if source.get("type") == "base64" and source.get("data"):
+        # the header sits at the start, no need to decode the whole image
+        from PIL import Image
+        try:
+            head = base64.b64decode(source["data"][:4096])
+            return Image.open(io.BytesIO(head)).size
+        except (OSError, ValueError, binascii.Error):
+            pass
+    return DEFAULT_IMAGE_SIZE
+
+def estimate_block_tokens(block: Dict[str, Any]) -> int:
+    kind = block.get("type")
+    if kind == "text":
+        return BLOCK_OVERHEAD + estimate_text_tokens(block.get("text", ""))
+    if kind == "image":
+        return BLOCK_OVERHEAD + estimate_image_tokens(*image_size(block))
+    if kind == "tool_use":
+        return BLOCK_OVERHEAD + estimate_text_tokens(block.get("name", "") + json.dumps(block.get("input", {})))
+    if kind == "tool_result":
+        content = block.get("content")
+        if isinstance(content, list):
+            return BLOCK_OVERHEAD + sum(estimate_block_tokens(item) for item in content)
+        return BLOCK_OVERHEAD + estimate_text_tokens(str(content or ""))
+    return BLOCK_OVERHEAD + estimate_text_tokens(json.dumps(block, default=str))
+
+class Entry:
+    def __init__(self, message: Dict[str, Any]):
+        self.message = message
+        self.tokens = sum(estimate_block_tokens(block) for block in message["content"])
+        # indices of blocks that hold an image
+        self.images = [idx for idx, block in enumerate(message["content"]) if has_image(block)]
+
+    def replace_content(self, content: List[Dict[str, Any]]) -> int:
+        # swaps in new content (the original message is never mutated), returns the token delta
+        old_tokens = self.tokens
+        self.message = {**self.message, "content": content}
+        self.tokens = sum(estimate_block_tokens(block) for block in content)
+        self.images = [idx for idx, block in enumerate(content) if has_image(block)]
+        return self.tokens - old_tokens
+
+def has_image(block: Dict[str, Any]) -> bool:
+    if block.get("type") == "image":
+        return True
+    return block.get("type") == "tool_result" and isinstance(block.get("content"), list) \
+        and any(item.get("type") == "image" for item in block["content"])
+
+def drop_images(block: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    # returns the block without images, None if nothing is left
+    if block.get("type") == "image":
+        return None
+    new_block = block.copy()
+    new_block["content"] = [item for item in block["content"] if item.get("type") != "image"]
+    return new_block
+
+class ContextManager:
+    def __init__(self, budget: int = DEFAULT_BUDGET, low_water: float = LOW_WATER, keep_recent_turns: int = KEEP_RECENT_TURNS,
+                 images: Optional[imagestore.ImageStore] = None):
+        self.budget = budget
+        # stored images referenced by dropped blocks are released here
+        self.images = images
+        self.low_water = low_water
+        self.keep_recent_turns = keep_recent_turns
+        self.entries: List[Entry] = []
+        self.tokens = 0
+        self.dropped_turns = 0
+        self.dropped_images = 0
+        self._summary: List[str] = []
+        self._task_content: Optional[List[Dict[str, Any]]] = None
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    @property
+    def messages(self) -> List[Dict[str, Any]]:
+        return [entry.message for entry in self.entries]
+
+    def append(self, message: Dict[str, Any]) -> None:
+        entry = Entry(message)
+        self.entries.append(entry)
+        self.tokens += entry.tokens
+
+    # everything needed to rebuild the history later, see checkpoint.py
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "messages": self.messages,
+            "dropped_turns": self.dropped_turns,
+            "dropped_images": self.dropped_images,
+            "summary": self._summary,
+            "task_content": self._task_content,
+        }
+
+    def restore(self, state: Dict[str, Any]) -> None:
+        self.entries = []
+        self.tokens = 0
+        for message in state["messages"]:
+            self.append(message)
+        self.dropped_turns = state.get("dropped_turns", 0)
+        self.dropped_images = state.get("dropped_images", 0)
+        self._summary = list(state.get("summary", []))
+        self._task_content = state.get("task_content")
+
+    def fit(self) -> List[Dict[str, Any]]:
+        # messages for the next request, trimmed if the history is over budget
+        if self.tokens > self.budget:
+            target = int(self.budget * self.low_water)
+            self._drop_images(target)
+            self._drop_turns(target)
+        return self.messages
+
+    def _protected(self) -> int:
+        # index of the first entry that belongs to the recent turns
+        return max(1, len(self.entries) - 2 * self.keep_recent_turns)
+
+    def _drop_images(self, target: int) -> None:
+        for entry in self.entries[:self._protected()]:
+            if self.tokens <= target:
+                return
+            if not entry.images:
+                continue
+            content = list(entry.message["content"])
+            for idx in entry.images:
+                self._release([content[idx]])
+                content[idx] = drop_images(content[idx])
+                self.dropped_images += 1
+            self.tokens += entry.replace_content([block for block in content if block is not None])
+
+    def _drop_turns(self, target: int) -> None:
+        # the first user message holds the task, drop (assistant, user) pairs after it
+        dropped = []
+        while self.tokens > target and 1 + 2 <= self._protected():
+            assistant, user = self.entries[1], self.entries[2]
+            if assistant.message["role"] != "assistant" or user.message["role"] != "user":
+                break
+            del self.entries[1:3]
+            self.tokens -= assistant.tokens + user.tokens
+            self._release(user.message["content"])
+            dropped.append(assistant.message)
+            self.dropped_turns += 1
+        if dropped:
+            self._summarise(dropped)
+
+    def _release(self, blocks: List[Dict[str, Any]]) -> None:
+        if self.images is not None:
+            self.images.release([key for block in blocks for key in imagestore.ref_ids(block)])
+
+    def _summarise(self, dropped: List[Dict[str, Any]]) -> None:
+        actions = []
+        for message in dropped:
+            for block in message["content"]:
+                if block.get("type") == "tool_use":
+                    actions.append(block.get("input", {}).get("action", block.get("name", "?")))
+                elif block.get("type") == "text" and block.get("text"):
+                    self._summary.append(block["text"].strip().splitlines()[0][:SUMMARY_LINE_CHARS])
+        note = f"[{self.dropped_turns} earlier turns omitted to save context"
+        if actions:
+            note += f"; recent omitted actions: {', '.join(actions[-20:])}"
+        note += "]\n" + "\n".join(self._summary[-SUMMARY_LINES:])
+
+        # the note rides along with the task message so roles keep alternating
+        first = self.entries[0]
+        if self._task_content is None:
+            self._task_content = first.message["content"]
+        self.tokens += first.replace_content(self._task_content + [{"type": "text", "text": note.strip()}])
@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+
+import io
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import TYPE_CHECKING, Dict, List, Optional, Sequence, Tuple
+
+if TYPE_CHECKING:
+    from PIL import Image
+
+# adaptive screenshot encoder: picks the format and quality per frame to stay
+# under a byte budget. flat UIs with few colours are sent as lossless palette
+# PNG (crisp text, often smaller than a JPEG); everything else tries WebP and
+# JPEG from the highest quality down and keeps the smaller candidate of the
+# first quality that fits. candidates are encoded in a shared worker pool
+# (Pillow releases the GIL while encoding), each worker reusing its buffer.
+# the token cost of an image depends only on its size, see scaling.py
+
+DEFAULT_MAX_BYTES = 150_000
+QUALITIES = (85, 70, 55, 40)
+FORMATS = ("png", "webp", "jpeg")
+# frames with at most this many colours are encoded as lossless palette png
+PALETTE_MAX_COLORS = 256
+ENCODE_WORKERS = min(4, os.cpu_count() or 1)
+# libwebp effort 0-6, 2 is about half the time of the default 4 for a few percent more bytes
+WEBP_METHOD = 2
+MEDIA_TYPES = {"png": "image/png", "webp": "image/webp", "jpeg": "image/jpeg"}
+
+_pool: Optional[ThreadPoolExecutor] = None
+_pool_lock = threading.Lock()
+_buffers = threading.local()
+
+def encode_pool() -> ThreadPoolExecutor:
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ThreadPoolExecutor(max_workers=ENCODE_WORKERS, thread_name_prefix="encode")
+        return _pool
+
+def encode_as(img: "Image.Image", fmt: str, quality: int = 0) -> bytes:
+    # one reused buffer per thread, the returned bytes are a copy
+    buf = getattr(_buffers, "buf", None)
+    if buf is None:
+        buf = _buffers.buf = io.BytesIO()
+    buf.seek(0)
+    buf.truncate()
+    if fmt == "png":
+        img.save(buf, format="PNG", optimize=False, compress_level=6)
+    elif fmt == "webp":
+        img.save(buf, format="WEBP", quality=quality, method=WEBP_METHOD)
+    else:
+        img.save(buf, format="JPEG", quality=quality)
+    return buf.getvalue()
+
+def available_formats(formats: Sequence[str]) -> List[str]:
+    from PIL import features
+    return [fmt for fmt in formats if fmt != "webp" or features.check("webp")]
+
+class Encoder:
+    def __init__(self, max_bytes: Optional[int] = DEFAULT_MAX_BYTES, formats: Sequence[str] = FORMATS,
+                 qualities: Sequence[int] = QUALITIES, grayscale: bool = False, parallel: bool = True):
+        unknown = set(formats) - set(MEDIA_TYPES)
+        if unknown:
+            raise ValueError(f"unknown image formats {sorted(unknown)}")
+        self.max_bytes = max_bytes
+        self.formats = available_formats(formats)
+        self.qualities = sorted(qualities, reverse=True)
+        self.grayscale = grayscale
+        self.parallel = parallel
+        # frames encoded per format
+        self.counts: Dict[str, int] = {}
+
+    def _fits(self, data: bytes) -> bool:
+        return self.max_bytes is None or len(data) <= self.max_bytes
+
+    def _encode_all(self, img: "Image.Image", fmts: List[str], quality: int) -> List[Tuple[str, bytes]]:
+        if self.parallel and len(fmts) > 1:
+            futures = [(fmt, encode_pool().submit(encode_as, img, fmt, quality)) for fmt in fmts]
+            return [(fmt, future.result()) for fmt, future in futures]
+        return [(fmt, encode_as(img, fmt, quality)) for fmt in fmts]
+
+    def prepare(self, img: "Image.Image", size: Optional[Tuple[int, int]] = None) -> "Image.Image":
+        from PIL import Image
+        mode = "L" if self.grayscale else "RGB"
+        if img.mode != mode:
+            img = img.convert(mode)
+        if size and tuple(size) != img.size:
+            img = img.resize(size, Image.Resampling.BILINEAR, reducing_gap=2.0)
+        return img
+
+    # returns (data, media_type, size)
+    def encode(self, img: "Image.Image", size: Optional[Tuple[int, int]] = None) -> Tuple[bytes, str, Tuple[int, int]]:
+        from PIL import Image
+        img = self.prepare(img, size)
+
+        if "png" in self.formats and img.getcolors(PALETTE_MAX_COLORS) is not None:
+            palette = img if img.mode == "L" else img.quantize(PALETTE_MAX_COLORS, Image.Quantize.FASTOCTREE)
+            data = encode_as(palette, "png")
+            if self._fits(data):
+                return self._chosen("png", data, img.size)
+
+        lossy = [fmt for fmt in self.formats if fmt != "png"]
+        if not lossy:
+            return self._chosen("png", encode_as(img, "png"), img.size)
+        best: Optional[Tuple[str, bytes]] = None
+        for quality in self.qualities:
+            fmt, data = min(self._encode_all(img, lossy, quality), key=lambda candidate: len(candidate[1]))
+            best = (fmt, data)
+            if self._fits(data):
+                break
+        # nothing fits: the smallest candidate at the lowest quality
+        return self._chosen(best[0], best[1], img.size)
+
+    def _chosen(self, fmt: str, data: bytes, size: Tuple[int, int]) -> Tuple[bytes, str, Tuple[int, int]]:
+        self.counts[fmt] = self.counts.get(fmt, 0) + 1
+        return data, MEDIA_TYPES[fmt], size
@@ -0,0 +1,56 @@
+#!/usr/bin/env python3
+
+import hashlib
+from typing import TYPE_CHECKING, Optional, Tuple
+
+if TYPE_CHECKING:
+    from PIL import Image
+
+# frame-diff layer: remembers the last frame sent to the model so unchanged
+# screens can be answered with a short text result instead of another image
+
+UNCHANGED_TEXT = "screen unchanged since previous step"
+
+# downsampled grid used for thresholded comparison, and the per-cell grey
+# level difference that counts as a changed cell
+FINGERPRINT_SIZE = (160, 100)
+CELL_TOLERANCE = 8
+
+def frame_digest(img: "Image.Image") -> bytes:
+    return hashlib.blake2b(img.tobytes(), digest_size=16).digest()
+
+def fingerprint(img: "Image.Image", size: Tuple[int, int] = FINGERPRINT_SIZE) -> bytes:
+    from PIL import Image
+    return img.resize(size, Image.Resampling.BOX).convert("L").tobytes()
+
+def changed_fraction(a: bytes, b: bytes) -> float:
+    if len(a) != len(b):
+        return 1.0
+    changed = sum(1 for pa, pb in zip(a, b) if abs(pa - pb) > CELL_TOLERANCE)
+    return changed / len(a)
+
+class FrameDiffer:
+    # threshold is the fraction of fingerprint cells allowed to change while
+    # still calling the frame unchanged; 0.0 means byte-identical frames only
+    def __init__(self, threshold: float = 0.0):
+        self.threshold = threshold
+        self.last_digest: Optional[bytes] = None
+        self.last_fingerprint: Optional[bytes] = None
+        self.skipped = 0
+
+    def reset(self) -> None:
+        self.last_digest = None
+        self.last_fingerprint = None
+
+    def is_unchanged(self, img: "Image.Image") -> bool:
+        if self.last_digest is None:
+            return False
+        if frame_digest(img) == self.last_digest:
+            return True
+        if self.threshold <= 0 or self.last_fingerprint is None:
+            return False
+        return changed_fraction(fingerprint(img), self.last_fingerprint) <= self.threshold
+
+    def mark_sent(self, img: "Image.Image") -> None:
+        self.last_digest = frame_digest(img)
+        self.last_fingerprint = fingerprint(img) if self.threshold > 0 else None
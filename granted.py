@@ -1,8 +1,14 @@
-from agent import run_agent_loop
+import argparse
+import batch
 
-# entry point
+# the three flows have 46 numbered steps between them; with an action and a
+# check per step a row needs about 100 turns, batch.py's defaults are too tight
+MAX_TURNS = 200
+TIMEOUT = 3600.0
+
+# entry point: python granted.py [rows, e.g. 51 or 51-60,72] [results file] [--max-turns N] [--timeout S]
 def main():
-    main_instructions = """You are in Row 51 of the FX Reimbursements 24-25 Google Sheet. You have access to a Payments tab in the browser.
+    main_instructions = """You are in Row {row} of the FX Reimbursements 24-25 Google Sheet. You have access to a Payments tab in the browser.
         Only record values from a box that you have selected. Do not look at any other rows. Do not use Alt Tab.
         Check every step before proceeding. If a step fails, try to fix it and do not move on.
         Execute the following steps in the browser. """
@@ -37,7 +43,7 @@ def main():
 
 
     document_instructions = """
-        You are in Row 51 of the FX Reimbursements 24-25 Google Sheet.
+        You are in Row {row} of the FX Reimbursements 24-25 Google Sheet.
         Only record values from a box that you have selected. Do not look at any other rows. Do not use Alt Tab.
         Check every step before proceeding. If a step fails, try to fix it and do not move on.
         Execute the following steps in the browser:
@@ -71,9 +77,20 @@ def main():
         24. Click "Save" in the top right corner.
         """
     
-    run_agent_loop(fillout_instructions)
-    run_agent_loop(fillout_instructions_2)
-    run_agent_loop(document_instructions)
+    parser = argparse.ArgumentParser(description="fill out reimbursement payment requests, one sheet row each")
+    parser.add_argument("rows", nargs="?", default="51", help="rows to process, e.g. 51 or 51-60,72")
+    parser.add_argument("results", nargs="?", default=batch.DEFAULT_RESULTS, help="JSON lines results file")
+    parser.add_argument("--max-turns", type=int, default=MAX_TURNS, help="model turns per row, all three flows together")
+    parser.add_argument("--timeout", type=float, default=TIMEOUT, help="seconds per row")
+    args = parser.parse_args()
+
+    batch.run_batch(
+        [fillout_instructions, fillout_instructions_2, document_instructions],
+        [{"row": row} for row in batch.parse_rows(args.rows)],
+        args.results,
+        max_turns=args.max_turns,
+        timeout=args.timeout,
+    )
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+
+import base64
+import hashlib
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+# content-addressed image store: screenshots are kept once as encoded bytes,
+# keyed by their hash, and messages hold a small reference instead of base64.
+# base64 is only built when a request payload is assembled (resolve). images
+# the history no longer references (trimmed, see context.py) stay around for
+# reuse until the store goes over its byte cap, then the least recently used go
+
+# cap on stored bytes, only images no message references can be evicted
+DEFAULT_MAX_BYTES = 32 * 1024 * 1024
+REF_TYPE = "ref"
+
+def image_id(data: bytes) -> str:
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+def b64_len(count: int) -> int:
+    return (count + 2) // 3 * 4
+
+def is_ref(block: Dict[str, Any]) -> bool:
+    return block.get("type") == "image" and block.get("source", {}).get("type") == REF_TYPE
+
+def ref_ids(block: Dict[str, Any]) -> Iterator[str]:
+    # ids referenced by an image block or by the images inside a tool_result
+    if is_ref(block):
+        yield block["source"]["id"]
+    elif block.get("type") == "tool_result" and isinstance(block.get("content"), list):
+        for item in block["content"]:
+            if is_ref(item):
+                yield item["source"]["id"]
+
+class ImageStore:
+    def __init__(self, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self._data: "OrderedDict[str, bytes]" = OrderedDict()
+        self._refs: Dict[str, int] = {}
+        self.bytes = 0
+        self.peak_bytes = 0
+        self.stats = {"stored": 0, "deduplicated": 0, "evicted": 0, "resolved": 0, "resolved_bytes": 0, "resolve_time": 0.0}
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._data
+
+    def put(self, data: bytes, media_type: str = "image/jpeg", size: Optional[Tuple[int, int]] = None) -> Dict[str, Any]:
+        # stores the bytes (once per content) and returns the source for an image block,
+        # the caller's message holds one reference until release
+        key = image_id(data)
+        if key in self._data:
+            self._data.move_to_end(key)
+            self.stats["deduplicated"] += 1
+        else:
+            self._data[key] = data
+            self.bytes += len(data)
+            self.peak_bytes = max(self.peak_bytes, self.bytes)
+            self.stats["stored"] += 1
+        self._refs[key] = self._refs.get(key, 0) + 1
+        self._evict()
+        source = {"type": REF_TYPE, "media_type": media_type, "id": key}
+        if size:
+            source["size"] = list(size)
+        return source
+
+    def get(self, key: str) -> bytes:
+        data = self._data[key]
+        self._data.move_to_end(key)
+        return data
+
+    def release(self, keys: List[str]) -> None:
+        for key in keys:
+            if self._refs.get(key, 0) > 1:
+                self._refs[key] -= 1
+            else:
+                self._refs.pop(key, None)
+        self._evict()
+
+    def _evict(self) -> None:
+        if self.bytes <= self.max_bytes:
+            return
+        for key in [key for key in self._data if key not in self._refs]:
+            self.bytes -= len(self._data.pop(key))
+            self.stats["evicted"] += 1
+            if self.bytes <= self.max_bytes:
+                return
+
+    def _resolve_block(self, block: Dict[str, Any]) -> Dict[str, Any]:
+        if is_ref(block):
+            data = self.get(block["source"]["id"])
+            self.stats["resolved"] += 1
+            self.stats["resolved_bytes"] += b64_len(len(data))
+            source = {"type": "base64", "media_type": block["source"]["media_type"],
+                      "data": base64.b64encode(data).decode("ascii")}
+            return {**block, "source": source}
+        if block.get("type") == "tool_result" and isinstance(block.get("content"), list) \
+                and any(is_ref(item) for item in block["content"]):
+            return {**block, "content": [self._resolve_block(item) for item in block["content"]]}
+        return block
+
+    def resolve(self, messages: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        # payload copy of the messages with base64 images, only messages with references are copied
+        start = time.perf_counter()
+        resolved = []
+        for message in messages:
+            content = message["content"]
+            if isinstance(content, list) and any(True for block in content for _ in ref_ids(block)):
+                message = {**message, "content": [self._resolve_block(block) for block in content]}
+            resolved.append(message)
+        self.stats["resolve_time"] += time.perf_counter() - start
+        return resolved
+
+    def report(self) -> str:
+        referenced = sum(len(self._data[key]) for key in self._refs if key in self._data)
+        return (f"images: {len(self._data)} held ({self.bytes / 1e6:.2f} MB, {referenced / 1e6:.2f} MB referenced, "
+                f"peak {self.peak_bytes / 1e6:.2f} MB), {self.stats['stored']} stored, "
+                f"{self.stats['deduplicated']} deduplicated, {self.stats['evicted']} evicted, "
+                f"base64 built for {self.stats['resolved']} ({self.stats['resolved_bytes'] / 1e6:.2f} MB) "
+                f"in {self.stats['resolve_time']:.3f}s")
@@ -0,0 +1,474 @@
+#!/usr/bin/env python3
+
+import functools
+import os
+import subprocess
+import sys
+import time
+from typing import List, Optional, Tuple
+
+# input drivers: one long-lived connection per screen, fed a stream of
+# events, with the cursor position tracked locally instead of re-queried.
+# coordinates are in input space (points on a retina mac), see scaling.py
+
+BUTTONS = ("left", "right", "middle")
+DRAG_STEPS = 10
+
+# text at least this long is pasted through the clipboard instead of typed
+PASTE_MIN_CHARS = 20
+# characters whose keystroke meaning differs from pasting them (e.g. enter in a form)
+KEYSTROKE_ONLY_CHARS = set("\n\r\t\b")
+# give the app time to read the clipboard before the old contents come back
+PASTE_RESTORE_DELAY = 0.15
+TYPE_MODES = ("auto", "keys", "paste")
+
+# sleep between consecutive events of a click, drag or chord, 0 posts them back to back
+EVENT_DELAY = float(os.environ.get("AGENT_EVENT_DELAY", "0"))
+
+# key names the model may use, mapped to the canonical names the backends know
+KEY_ALIASES = {
+    "return": "enter",
+    "escape": "esc",
+    "arrow-down": "down",
+    "arrow-up": "up",
+    "arrow-left": "left",
+    "arrow-right": "right",
+    "page-down": "pagedown",
+    "page-up": "pageup",
+    "page_down": "pagedown",
+    "page_up": "pageup",
+    "control": "ctrl",
+    "cmd": "command",
+    "super": "command",
+    "option": "alt",
+    "del": "delete",
+    "spacebar": "space",
+}
+MODIFIERS = ("shift", "ctrl", "alt", "command")
+
+# pixels per wheel click, for click-based scroll requests and backends without pixel scrolling
+PIXELS_PER_CLICK = 50
+
+# "cmd+shift+t" -> ("command", "shift", "t"), cached so repeated chords skip the parsing
+@functools.lru_cache(maxsize=256)
+def parse_keys(key: str) -> Tuple[str, ...]:
+    keys = tuple(KEY_ALIASES.get(k, k) for k in (part.strip().lower() for part in key.split("+")))
+    if not all(keys):
+        raise ValueError(f"bad key combination {key!r}")
+    return keys
+
+def choose_type_mode(text: str) -> str:
+    if len(text) < PASTE_MIN_CHARS or any(ch in KEYSTROKE_ONLY_CHARS for ch in text):
+        return "keys"
+    return "paste"
+
+class InputDriver:
+    def __init__(self, event_delay: float = EVENT_DELAY):
+        self._position: Optional[Tuple[int, int]] = None
+        self.event_delay = event_delay
+
+    # backend hooks
+    def _query_position(self) -> Tuple[int, int]:
+        raise NotImplementedError
+
+    def _move(self, x: int, y: int, held: Optional[str] = None) -> None:
+        raise NotImplementedError
+
+    def _button(self, button: str, down: bool, count: int = 1) -> None:
+        raise NotImplementedError
+
+    def _scroll(self, dx: int, dy: int) -> None:
+        raise NotImplementedError
+
+    # held lists the modifiers down while this event is posted
+    def _key(self, name: str, down: bool, held: Tuple[str, ...] = ()) -> None:
+        raise NotImplementedError
+
+    # raises ValueError for a key _key cannot post, checked before anything is pressed
+    def _check_key(self, name: str, held: Tuple[str, ...] = ()) -> None:
+        pass
+
+    def _type_keys(self, text: str) -> None:
+        raise NotImplementedError
+
+    def _paste_chord(self) -> None:
+        raise NotImplementedError
+
+    def _get_clipboard(self) -> Optional[str]:
+        raise NotImplementedError
+
+    def _set_clipboard(self, text: str) -> None:
+        raise NotImplementedError
+
+    def close(self) -> None:
+        pass
+
+    def _pause(self) -> None:
+        if self.event_delay:
+            time.sleep(self.event_delay)
+
+    # public api
+    def cursor_position(self) -> Tuple[int, int]:
+        if self._position is None:
+            self._position = self._query_position()
+        return self._position
+
+    def move(self, x: int, y: int) -> None:
+        self._move(x, y)
+        self._position = (x, y)
+
+    def click(self, button: str = "left", count: int = 1) -> None:
+        if button not in BUTTONS:
+            raise ValueError(f"unknown mouse button {button!r}")
+        self.cursor_position()
+        for i in range(1, count + 1):
+            self._button(button, True, i)
+            self._pause()
+            self._button(button, False, i)
+            if i < count:
+                self._pause()
+
+    def drag(self, x_end: int, y_end: int) -> None:
+        x_start, y_start = self.cursor_position()
+        self._button("left", True)
+        # the button must not stay down if a move fails
+        try:
+            for i in range(1, DRAG_STEPS + 1):
+                x = x_start + (x_end - x_start) * i // DRAG_STEPS
+                y = y_start + (y_end - y_start) * i // DRAG_STEPS
+                self._move(x, y, held="left")
+                self._position = (x, y)
+                self._pause()
+        finally:
+            self._button("left", False)
+
+    # presses a key or chord: keys go down in order and come up in reverse.
+    # every key is checked first, and whatever went down is released even if a
+    # later key fails, so no modifier stays held for the rest of the session
+    def key(self, key: str) -> None:
+        keys = parse_keys(key)
+        held: List[str] = []
+        for name in keys:
+            if name in MODIFIERS:
+                held.append(name)
+            self._check_key(name, tuple(held))
+        held, pressed = [], []
+        try:
+            for name in keys:
+                if name in MODIFIERS:
+                    held.append(name)
+                self._key(name, True, tuple(held))
+                pressed.append(name)
+                self._pause()
+        finally:
+            for i, name in enumerate(reversed(pressed)):
+                if name in held:
+                    held.remove(name)
+                self._key(name, False, tuple(held))
+                if i < len(pressed) - 1:
+                    self._pause()
+
+    # wheel scroll at the cursor, positive dy scrolls down and positive dx right
+    def scroll(self, dx: int, dy: int) -> None:
+        self.cursor_position()
+        self._scroll(dx, dy)
+
+    # short or special-character text is typed, long text pasted, see choose_type_mode
+    def type_text(self, text: str, mode: str = "auto") -> str:
+        if mode not in TYPE_MODES:
+            raise ValueError(f"unknown type mode {mode!r}")
+        if mode == "auto":
+            mode = choose_type_mode(text)
+        if mode == "keys":
+            self._type_keys(text)
+            return mode
+
+        saved = self._get_clipboard()
+        self._set_clipboard(text)
+        try:
+            self._paste_chord()
+            time.sleep(PASTE_RESTORE_DELAY)
+        finally:
+            if saved is not None:
+                self._set_clipboard(saved)
+        return mode
+
+def run_clipboard(cmd: List[str], text: Optional[str] = None, env: Optional[dict] = None) -> Optional[str]:
+    if text is not None:
+        # xclip keeps running to serve the selection, so its output must not be a pipe we wait on
+        subprocess.run(cmd, input=text.encode(), stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+                       timeout=5, env=env)
+        return None
+    proc = subprocess.run(cmd, capture_output=True, timeout=5, env=env)
+    if proc.returncode != 0:
+        return None
+    return proc.stdout.decode(errors="replace")
+
+class MacInput(InputDriver):
+    # posts CGEvents in-process through Quartz (pyobjc-framework-Quartz)
+    def __init__(self, event_delay: float = EVENT_DELAY):
+        super().__init__(event_delay)
+        import Quartz
+        self.Q = Quartz
+        self._event_types = {
+            "left": (Quartz.kCGEventLeftMouseDown, Quartz.kCGEventLeftMouseUp, Quartz.kCGEventLeftMouseDragged, Quartz.kCGMouseButtonLeft),
+            "right": (Quartz.kCGEventRightMouseDown, Quartz.kCGEventRightMouseUp, Quartz.kCGEventRightMouseDragged, Quartz.kCGMouseButtonRight),
+            "middle": (Quartz.kCGEventOtherMouseDown, Quartz.kCGEventOtherMouseUp, Quartz.kCGEventOtherMouseDragged, Quartz.kCGMouseButtonCenter),
+        }
+        self._modifier_flags = {
+            "shift": Quartz.kCGEventFlagMaskShift,
+            "ctrl": Quartz.kCGEventFlagMaskControl,
+            "alt": Quartz.kCGEventFlagMaskAlternate,
+            "command": Quartz.kCGEventFlagMaskCommand,
+        }
+
+    def _post(self, event) -> None:
+        self.Q.CGEventPost(self.Q.kCGHIDEventTap, event)
+
+    def _query_position(self) -> Tuple[int, int]:
+        loc = self.Q.CGEventGetLocation(self.Q.CGEventCreate(None))
+        return int(loc.x), int(loc.y)
+
+    def _move(self, x: int, y: int, held: Optional[str] = None) -> None:
+        if held:
+            event_type, button = self._event_types[held][2], self._event_types[held][3]
+        else:
+            event_type, button = self.Q.kCGEventMouseMoved, self.Q.kCGMouseButtonLeft
+        self._post(self.Q.CGEventCreateMouseEvent(None, event_type, (x, y), button))
+
+    def _button(self, button: str, down: bool, count: int = 1) -> None:
+        down_type, up_type, _, cg_button = self._event_types[button]
+        event = self.Q.CGEventCreateMouseEvent(None, down_type if down else up_type, self._position, cg_button)
+        # click state makes the os see consecutive clicks as a double click
+        self.Q.CGEventSetIntegerValueField(event, self.Q.kCGMouseEventClickState, count)
+        self._post(event)
+
+    def _scroll(self, dx: int, dy: int) -> None:
+        # quartz wheel deltas are positive towards the top/left
+        self._post(self.Q.CGEventCreateScrollWheelEvent(None, self.Q.kCGScrollEventUnitPixel, 2, -dy, -dx))
+
+    # virtual keycodes for the us ansi layout
+    MAC_KEYCODES = {
+        "a": 0, "s": 1, "d": 2, "f": 3, "h": 4, "g": 5, "z": 6, "x": 7, "c": 8, "v": 9, "b": 11,
+        "q": 12, "w": 13, "e": 14, "r": 15, "y": 16, "t": 17, "1": 18, "2": 19, "3": 20, "4": 21,
+        "6": 22, "5": 23, "=": 24, "9": 25, "7": 26, "-": 27, "8": 28, "0": 29, "]": 30, "o": 31,
+        "u": 32, "[": 33, "i": 34, "p": 35, "enter": 36, "l": 37, "j": 38, "'": 39, "k": 40, ";": 41,
+        "\\": 42, ",": 43, "/": 44, "n": 45, "m": 46, ".": 47, "tab": 48, "space": 49, " ": 49, "`": 50,
+        "backspace": 51, "esc": 53, "command": 55, "shift": 56, "capslock": 57, "alt": 58, "ctrl": 59,
+        "f5": 96, "f6": 97, "f7": 98, "f3": 99, "f8": 100, "f9": 101, "f11": 103, "f10": 109, "f12": 111,
+        "home": 115, "pageup": 116, "delete": 117, "f4": 118, "end": 119, "f2": 120, "pagedown": 121,
+        "f1": 122, "left": 123, "right": 124, "down": 125, "up": 126,
+    }
+
+    def _check_key(self, name: str, held: Tuple[str, ...] = ()) -> None:
+        # other single characters are typed as unicode, which only works without modifiers
+        if name not in self.MAC_KEYCODES and (len(name) != 1 or held):
+            raise ValueError(f"unknown key {name!r}")
+
+    def _key(self, name: str, down: bool, held: Tuple[str, ...] = ()) -> None:
+        keycode = self.MAC_KEYCODES.get(name)
+        if keycode is None:
+            self._check_key(name, held)
+            if down:
+                self._type_unicode(name)
+            return
+        flags = 0
+        for modifier in held:
+            flags |= self._modifier_flags[modifier]
+        self._keycode(keycode, down, flags)
+
+    # virtual keycodes used by the text path
+    MAC_TEXT_KEYS = {"\n": 36, "\r": 36, "\t": 48, "\b": 51}
+    MAC_KEY_V = 9
+    # a keyboard event carries at most 20 utf-16 units of text
+    MAC_UNICODE_CHUNK = 20
+
+    def _keycode(self, keycode: int, down: bool, flags: int = 0) -> None:
+        event = self.Q.CGEventCreateKeyboardEvent(None, keycode, down)
+        if flags:
+            self.Q.CGEventSetFlags(event, flags)
+        self._post(event)
+
+    def _type_unicode(self, chunk: str) -> None:
+        # unicode events type any character without a keymap lookup
+        for down in (True, False):
+            event = self.Q.CGEventCreateKeyboardEvent(None, 0, down)
+            self.Q.CGEventKeyboardSetUnicodeString(event, len(chunk.encode("utf-16-le")) // 2, chunk)
+            self._post(event)
+
+    def _type_keys(self, text: str) -> None:
+        chunk = ""
+        for ch in text:
+            if ch in self.MAC_TEXT_KEYS:
+                if chunk:
+                    self._type_unicode(chunk)
+                    chunk = ""
+                self._keycode(self.MAC_TEXT_KEYS[ch], True)
+                self._keycode(self.MAC_TEXT_KEYS[ch], False)
+                continue
+            if len((chunk + ch).encode("utf-16-le")) // 2 > self.MAC_UNICODE_CHUNK:
+                self._type_unicode(chunk)
+                chunk = ""
+            chunk += ch
+        if chunk:
+            self._type_unicode(chunk)
+
+    def _paste_chord(self) -> None:
+        flags = self.Q.kCGEventFlagMaskCommand
+        self._keycode(self.MAC_KEY_V, True, flags)
+        self._keycode(self.MAC_KEY_V, False, flags)
+
+    def _get_clipboard(self) -> Optional[str]:
+        return run_clipboard(["pbpaste"])
+
+    def _set_clipboard(self, text: str) -> None:
+        run_clipboard(["pbcopy"], text)
+
+class X11Input(InputDriver):
+    # XTest events over one persistent Xlib connection (python-xlib), works with Xvfb
+    X11_BUTTONS = {"left": 1, "middle": 2, "right": 3}
+
+    def __init__(self, display: Optional[str] = None, event_delay: float = EVENT_DELAY):
+        super().__init__(event_delay)
+        from Xlib import X, display as xdisplay
+        from Xlib.ext import xtest
+        self.X = X
+        self.xtest = xtest
+        self.display = xdisplay.Display(display or os.environ.get("DISPLAY", ":0"))
+
+    def _query_position(self) -> Tuple[int, int]:
+        pointer = self.display.screen().root.query_pointer()
+        return pointer.root_x, pointer.root_y
+
+    def _move(self, x: int, y: int, held: Optional[str] = None) -> None:
+        self.xtest.fake_input(self.display, self.X.MotionNotify, x=x, y=y)
+        self.display.sync()
+
+    def _button(self, button: str, down: bool, count: int = 1) -> None:
+        event_type = self.X.ButtonPress if down else self.X.ButtonRelease
+        self.xtest.fake_input(self.display, event_type, self.X11_BUTTONS[button])
+        self.display.sync()
+
+    # wheel buttons: up, down, left, right
+    X11_WHEEL = {"up": 4, "down": 5, "left": 6, "right": 7}
+
+    def _scroll(self, dx: int, dy: int) -> None:
+        for pixels, negative, positive in ((dy, "up", "down"), (dx, "left", "right")):
+            if not pixels:
+                continue
+            button = self.X11_WHEEL[positive if pixels > 0 else negative]
+            for _ in range(max(1, round(abs(pixels) / PIXELS_PER_CLICK))):
+                self.xtest.fake_input(self.display, self.X.ButtonPress, button)
+                self.xtest.fake_input(self.display, self.X.ButtonRelease, button)
+        self.display.sync()
+
+    X11_KEYSYMS = {
+        "enter": 0xff0d, "tab": 0xff09, "backspace": 0xff08, "esc": 0xff1b, "delete": 0xffff,
+        "home": 0xff50, "left": 0xff51, "up": 0xff52, "right": 0xff53, "down": 0xff54,
+        "pageup": 0xff55, "pagedown": 0xff56, "end": 0xff57, "insert": 0xff63, "capslock": 0xffe5,
+        "shift": 0xffe1, "ctrl": 0xffe3, "alt": 0xffe9, "command": 0xffeb, "space": 0x20,
+        **{f"f{i}": 0xffbd + i for i in range(1, 13)},
+    }
+
+    def _key_keysym(self, name: str) -> int:
+        keysym = self.X11_KEYSYMS.get(name)
+        if keysym is None:
+            if len(name) != 1:
+                raise ValueError(f"unknown key {name!r}")
+            keysym = ord(name) if ord(name) < 0x100 else 0x1000000 + ord(name)
+        return keysym
+
+    def _check_key(self, name: str, held: Tuple[str, ...] = ()) -> None:
+        keysym = self._key_keysym(name)
+        if not self.display.keysym_to_keycode(keysym):
+            raise ValueError(f"no keycode for key {name!r}")
+
+    def _key(self, name: str, down: bool, held: Tuple[str, ...] = ()) -> None:
+        self._keysym(self._key_keysym(name), down)
+        self.display.sync()
+
+    X11_TEXT_KEYSYMS = {"\n": 0xff0d, "\r": 0xff0d, "\t": 0xff09, "\b": 0xff08}
+    X11_SHIFT = 0xffe1
+    X11_CONTROL = 0xffe3
+
+    def _keysym(self, keysym: int, down: bool) -> None:
+        keycode = self.display.keysym_to_keycode(keysym)
+        if not keycode:
+            raise ValueError(f"no keycode for keysym {keysym:#x}")
+        self.xtest.fake_input(self.display, self.X.KeyPress if down else self.X.KeyRelease, keycode)
+
+    def _type_keys(self, text: str) -> None:
+        for ch in text:
+            if ch in self.X11_TEXT_KEYSYMS:
+                keysym = self.X11_TEXT_KEYSYMS[ch]
+            else:
+                # latin-1 keysyms equal the code point, the rest live at 0x1000000 + code point
+                keysym = ord(ch) if ord(ch) < 0x100 else 0x1000000 + ord(ch)
+            keycode = self.display.keysym_to_keycode(keysym)
+            shifted = bool(keycode) and self.display.keycode_to_keysym(keycode, 0) != keysym
+            if shifted:
+                self._keysym(self.X11_SHIFT, True)
+            self._keysym(keysym, True)
+            self._keysym(keysym, False)
+            if shifted:
+                self._keysym(self.X11_SHIFT, False)
+        self.display.sync()
+
+    def _paste_chord(self) -> None:
+        self._keysym(self.X11_CONTROL, True)
+        self._keysym(ord("v"), True)
+        self._keysym(ord("v"), False)
+        self._keysym(self.X11_CONTROL, False)
+        self.display.sync()
+
+    def _clipboard_env(self) -> dict:
+        return {**os.environ, "DISPLAY": self.display.get_display_name()}
+
+    def _get_clipboard(self) -> Optional[str]:
+        return run_clipboard(["xclip", "-selection", "clipboard", "-o"], env=self._clipboard_env())
+
+    def _set_clipboard(self, text: str) -> None:
+        run_clipboard(["xclip", "-selection", "clipboard", "-i"], text, env=self._clipboard_env())
+
+    def close(self) -> None:
+        self.display.close()
+
+class FakeInput(InputDriver):
+    # records events in memory for tests and replays
+    def __init__(self, position: Tuple[int, int] = (0, 0), event_delay: float = EVENT_DELAY):
+        super().__init__(event_delay)
+        self.start = position
+        self.events: List[tuple] = []
+        self.clipboard: Optional[str] = ""
+
+    def _query_position(self) -> Tuple[int, int]:
+        return self.start
+
+    def _move(self, x: int, y: int, held: Optional[str] = None) -> None:
+        self.events.append(("move", x, y, held))
+
+    def _button(self, button: str, down: bool, count: int = 1) -> None:
+        self.events.append(("down" if down else "up", button, count))
+
+    def _scroll(self, dx: int, dy: int) -> None:
+        self.events.append(("scroll", dx, dy))
+
+    def _key(self, name: str, down: bool, held: Tuple[str, ...] = ()) -> None:
+        self.events.append(("key", name, down))
+
+    def _type_keys(self, text: str) -> None:
+        self.events.append(("keys", text))
+
+    def _paste_chord(self) -> None:
+        self.events.append(("paste", self.clipboard))
+
+    def _get_clipboard(self) -> Optional[str]:
+        return self.clipboard
+
+    def _set_clipboard(self, text: str) -> None:
+        self.clipboard = text
+
+def default_input_driver(display: Optional[str] = None, event_delay: float = EVENT_DELAY) -> InputDriver:
+    if sys.platform == "darwin":
+        return MacInput(event_delay)
+    return X11Input(display, event_delay)
@@ -0,0 +1,313 @@
+#!/usr/bin/env python3
+
+import json
+import os
+import random
+import sys
+import threading
+import time
+import types
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+import context
+
+# rate-limit-aware client wrapper: 429/529 and connection errors are retried with
+# jittered exponential backoff, honouring retry-after. sessions in one process
+# share a RateLimiter (token buckets for requests and input tokens per minute),
+# so they queue for capacity instead of all hitting the limit at once, and a
+# retry-after from one session pauses the others too
+
+# per-minute limits of the shared limiter, unset means no local limit
+REQUESTS_PER_MINUTE = int(os.environ["AGENT_RPM"]) if os.getenv("AGENT_RPM") else None
+INPUT_TOKENS_PER_MINUTE = int(os.environ["AGENT_ITPM"]) if os.getenv("AGENT_ITPM") else None
+MAX_RETRIES = 6
+BASE_DELAY = 1.0
+MAX_DELAY = 60.0
+RETRY_STATUS = {408, 429, 500, 502, 503, 504, 529}
+
+class TokenBucket:
+    # refills continuously up to capacity; reservations may go into debt, which
+    # is what makes later callers queue behind earlier ones
+    def __init__(self, per_minute: float, capacity: Optional[float] = None):
+        self.rate = per_minute / 60.0
+        self.capacity = capacity or per_minute
+        self.level = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def reserve(self, amount: float) -> float:
+        # takes amount now, returns the seconds to wait before using it
+        with self.lock:
+            self._refill()
+            self.level -= min(amount, self.capacity)
+            return max(0.0, -self.level / self.rate)
+
+    def adjust(self, amount: float) -> None:
+        # corrects an earlier reservation, positive amounts take more
+        with self.lock:
+            self._refill()
+            self.level = min(self.capacity, self.level - amount)
+
+class RateLimiter:
+    def __init__(self, requests_per_minute: Optional[int] = REQUESTS_PER_MINUTE,
+                 input_tokens_per_minute: Optional[int] = INPUT_TOKENS_PER_MINUTE):
+        self.requests = TokenBucket(requests_per_minute) if requests_per_minute else None
+        self.input_tokens = TokenBucket(input_tokens_per_minute) if input_tokens_per_minute else None
+        self.paused_until = 0.0
+        self.metrics = {"requests": 0, "retries": 0, "rate_limited": 0, "queued": 0, "queue_wait": 0.0, "max_queue_wait": 0.0}
+        self.lock = threading.Lock()
+
+    def reserve(self, tokens: int) -> float:
+        delay = max(0.0, self.paused_until - time.monotonic())
+        if self.requests:
+            delay = max(delay, self.requests.reserve(1))
+        if self.input_tokens:
+            delay = max(delay, self.input_tokens.reserve(tokens))
+        with self.lock:
+            self.metrics["requests"] += 1
+            if delay > 0:
+                self.metrics["queued"] += 1
+                self.metrics["queue_wait"] += delay
+                self.metrics["max_queue_wait"] = max(self.metrics["max_queue_wait"], delay)
+        return delay
+
+    def settle(self, estimated: int, actual: int) -> None:
+        if self.input_tokens:
+            self.input_tokens.adjust(actual - estimated)
+
+    def pause(self, seconds: float) -> None:
+        # a retry-after holds back every session sharing this limiter
+        with self.lock:
+            self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+
+    def count(self, name: str) -> None:
+        with self.lock:
+            self.metrics[name] += 1
+
+    def summary(self) -> str:
+        m = self.metrics
+        return (f"rate limiter: {m['requests']} requests, {m['retries']} retries ({m['rate_limited']} rate limited), "
+                f"{m['queued']} queued for {m['queue_wait']:.1f}s total, {m['max_queue_wait']:.1f}s max")
+
+_shared_limiter: Optional[RateLimiter] = None
+
+def shared_limiter() -> RateLimiter:
+    global _shared_limiter
+    if _shared_limiter is None:
+        _shared_limiter = RateLimiter()
+    return _shared_limiter
+
+def estimate_input_tokens(params: Dict[str, Any]) -> int:
+    blocks = [block for message in params.get("messages", []) if isinstance(message.get("content"), list)
+              for block in message["content"]]
+    blocks += [block for block in params.get("system", []) if isinstance(block, dict)]
+    return sum(context.estimate_block_tokens(block) for block in blocks)
+
+def retry_after(error: Exception) -> Optional[float]:
+    response = getattr(error, "response", None)
+    if response is None:
+        return None
+    for header, scale in (("retry-after-ms", 0.001), ("retry-after", 1.0)):
+        value = response.headers.get(header)
+        if value:
+            try:
+                return float(value) * scale
+            except ValueError:
+                pass
+    return None
+
+def is_retryable(error: Exception) -> bool:
+    from anthropic import APIConnectionError, APIStatusError
+    if isinstance(error, APIStatusError):
+        return error.status_code in RETRY_STATUS
+    return isinstance(error, APIConnectionError)
+
+def backoff(attempt: int, base_delay: float = BASE_DELAY, max_delay: float = MAX_DELAY) -> float:
+    # full jitter: uniform between half and all of the exponential delay
+    delay = min(max_delay, base_delay * 2 ** attempt)
+    return random.uniform(delay / 2, delay)
+
+def used_input_tokens(response: Any) -> int:
+    usage = getattr(response, "usage", None)
+    return sum(getattr(usage, field, None) or 0 for field in ("input_tokens", "cache_creation_input_tokens"))
+
+class RateLimitedClient:
+    # wraps an Anthropic client (created with max_retries=0, retries happen here);
+    # exposes beta.messages.create and beta.messages.stream like the client itself
+    def __init__(self, client: Any, limiter: Optional[RateLimiter] = None, max_retries: int = MAX_RETRIES,
+                 base_delay: float = BASE_DELAY, max_delay: float = MAX_DELAY):
+        self.client = client
+        self.limiter = limiter or shared_limiter()
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.metrics = {"requests": 0, "retries": 0, "queue_wait": 0.0}
+        self.beta = types.SimpleNamespace(messages=types.SimpleNamespace(create=self.create, stream=self.stream))
+
+    def _wait(self, params: Dict[str, Any]) -> int:
+        tokens = estimate_input_tokens(params)
+        delay = self.limiter.reserve(tokens)
+        self.metrics["requests"] += 1
+        self.metrics["queue_wait"] += delay
+        if delay > 0:
+            time.sleep(delay)
+        return tokens
+
+    def _retry_delay(self, error: Exception, attempt: int) -> Optional[float]:
+        # None when the error is final
+        if attempt >= self.max_retries or not is_retryable(error):
+            return None
+        delay = retry_after(error)
+        if getattr(error, "status_code", None) == 429:
+            self.limiter.count("rate_limited")
+        if delay is not None:
+            self.limiter.pause(delay)
+        else:
+            delay = backoff(attempt, self.base_delay, self.max_delay)
+        self.limiter.count("retries")
+        self.metrics["retries"] += 1
+        print(f"api error ({error.__class__.__name__}), retrying in {delay:.1f}s [{attempt + 1}/{self.max_retries}]")
+        return delay
+
+    def create(self, **params: Any) -> Any:
+        attempt = 0
+        while True:
+            tokens = self._wait(params)
+            try:
+                response = self.client.beta.messages.create(**params)
+            except Exception as e:
+                self.limiter.settle(tokens, 0)
+                delay = self._retry_delay(e, attempt)
+                if delay is None:
+                    raise
+                time.sleep(delay)
+                attempt += 1
+                continue
+            self.limiter.settle(tokens, used_input_tokens(response))
+            return response
+
+    @contextmanager
+    def stream(self, **params: Any) -> Iterator[Any]:
+        # errors are only retried while opening the stream, not halfway through it
+        attempt = 0
+        while True:
+            tokens = self._wait(params)
+            manager = self.client.beta.messages.stream(**params)
+            try:
+                stream = manager.__enter__()
+                break
+            except Exception as e:
+                self.limiter.settle(tokens, 0)
+                delay = self._retry_delay(e, attempt)
+                if delay is None:
+                    raise
+                time.sleep(delay)
+                attempt += 1
+        try:
+            yield stream
+        except BaseException:
+            if not manager.__exit__(*sys.exc_info()):
+                raise
+        else:
+            manager.__exit__(None, None, None)
+            self.limiter.settle(tokens, used_input_tokens(stream.get_final_message()))
+
+    def summary(self) -> str:
+        return (f"client: {self.metrics['requests']} requests, {self.metrics['retries']} retries, "
+                f"{self.metrics['queue_wait']:.1f}s queued; {self.limiter.summary()}")
+
+class AsyncRateLimitedClient(RateLimitedClient):
+    # the same for AsyncAnthropic, waits are awaited instead of slept
+    def __init__(self, client: Any, *args: Any, **kwargs: Any):
+        super().__init__(client, *args, **kwargs)
+        self.beta = types.SimpleNamespace(messages=types.SimpleNamespace(create=self.create))
+
+    async def create(self, **params: Any) -> Any:
+        import asyncio
+        attempt = 0
+        while True:
+            tokens = estimate_input_tokens(params)
+            delay = self.limiter.reserve(tokens)
+            self.metrics["requests"] += 1
+            self.metrics["queue_wait"] += delay
+            if delay > 0:
+                await asyncio.sleep(delay)
+            try:
+                response = await self.client.beta.messages.create(**params)
+            except Exception as e:
+                self.limiter.settle(tokens, 0)
+                delay = self._retry_delay(e, attempt)
+                if delay is None:
+                    raise
+                await asyncio.sleep(delay)
+                attempt += 1
+                continue
+            self.limiter.settle(tokens, used_input_tokens(response))
+            return response
+
+# local fake of the messages endpoint for exercising the retry path: replies
+# follow a script of (status, headers) and fall back to a short text response
+class FakeServer:
+    def __init__(self, script: Optional[List[Tuple[int, Dict[str, str]]]] = None):
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+        self.script = list(script or [])
+        self.requests = 0
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self) -> None:
+                self.rfile.read(int(self.headers.get("content-length", 0)))
+                server.requests += 1
+                status, headers = server.script.pop(0) if server.script else (200, {})
+                if status == 200:
+                    body = {"id": f"msg_{server.requests}", "type": "message", "role": "assistant", "model": "fake",
+                            "content": [{"type": "text", "text": "ok"}], "stop_reason": "end_turn",
+                            "stop_sequence": None, "usage": {"input_tokens": 10, "output_tokens": 1}}
+                else:
+                    body = {"type": "error", "error": {"type": "rate_limit_error" if status == 429 else "overloaded_error",
+                                                       "message": f"scripted {status}"}}
+                data = json.dumps(body).encode()
+                self.send_response(status)
+                self.send_header("content-type", "application/json")
+                self.send_header("content-length", str(len(data)))
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, *args: Any) -> None:
+                pass
+
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.httpd.server_address[1]}"
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    def __enter__(self) -> "FakeServer":
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+if __name__ == "__main__":
+    # python ratelimit.py: four sessions share a limiter against a fake server that rate limits the first calls
+    from anthropic import Anthropic
+    from concurrent.futures import ThreadPoolExecutor
+    script = [(429, {"retry-after": "1"}), (529, {}), (429, {}), (200, {})]
+    with FakeServer(script) as server:
+        limiter = RateLimiter(requests_per_minute=120, input_tokens_per_minute=6000)
+        clients = [RateLimitedClient(Anthropic(api_key="test", base_url=server.url, max_retries=0), limiter,
+                                     base_delay=0.2) for _ in range(4)]
+        params = {"model": "fake", "max_tokens": 16, "messages": [{"role": "user", "content": [{"type": "text", "text": "hi " * 400}]}]}
+        start = time.monotonic()
+        with ThreadPoolExecutor(max_workers=4) as pool:
+            replies = list(pool.map(lambda client: client.beta.messages.create(**params), clients))
+        print(f"{len(replies)} replies in {time.monotonic() - start:.1f}s after {server.requests} requests")
+        print(limiter.summary())
@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+
+import copy
+import hashlib
+import json
+import sys
+import types
+from pathlib import Path
+from typing import Any, Callable, Optional
+from PIL import Image
+
+import capture
+import inputs
+import tool
+
+# record-and-replay: a recording session saves every request/response pair,
+# every captured frame and every user reply to a session directory; a replay
+# session feeds them back through a fake client and a fake screen, so runs
+# are deterministic and network-free and only our own overhead is measured
+
+SESSION_FILE = "session.json"
+
+def strip_images(value: Any) -> Any:
+    # replaces base64 image data with its hash, the frames are saved separately
+    if isinstance(value, dict):
+        if value.get("type") == "base64" and isinstance(value.get("data"), str):
+            return {**value, "data": "sha1:" + hashlib.sha1(value["data"].encode()).hexdigest()}
+        return {key: strip_images(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [strip_images(item) for item in value]
+    return value
+
+class RecordingClient:
+    def __init__(self, client: Any, session_dir: str):
+        self.client = client
+        self.dir = Path(session_dir)
+        self.dir.mkdir(parents=True, exist_ok=True)
+        self.turn = 0
+        self.beta = types.SimpleNamespace(messages=types.SimpleNamespace(create=self.create))
+
+    def create(self, **kwargs: Any) -> Any:
+        response = self.client.beta.messages.create(**kwargs)
+        request = strip_images(copy.deepcopy(kwargs))
+        (self.dir / f"request_{self.turn:04d}.json").write_text(json.dumps(request, indent=1, default=str))
+        (self.dir / f"response_{self.turn:04d}.json").write_text(response.model_dump_json(indent=1))
+        self.turn += 1
+        return response
+
+class ReplayClient:
+    def __init__(self, session_dir: str):
+        from anthropic.types.beta import BetaMessage
+        self.responses = [BetaMessage.model_validate_json(path.read_text())
+                          for path in sorted(Path(session_dir).glob("response_*.json"))]
+        self.turn = 0
+        self.beta = types.SimpleNamespace(messages=types.SimpleNamespace(create=self.create))
+
+    def create(self, **kwargs: Any) -> Any:
+        if self.turn >= len(self.responses):
+            raise RuntimeError(f"replay ran out of recorded responses after {self.turn} turns")
+        response = self.responses[self.turn]
+        self.turn += 1
+        return response
+
+class RecordingCapture(capture.CaptureBackend):
+    # passes captures through and saves each full frame, previews are not recorded
+    def __init__(self, backend: capture.CaptureBackend, session_dir: str):
+        self.backend = backend
+        self.scale_factor = backend.scale_factor
+        self.dir = Path(session_dir)
+        self.dir.mkdir(parents=True, exist_ok=True)
+        self.frames = 0
+
+    def capture(self) -> Image.Image:
+        img = self.backend.capture()
+        img.save(self.dir / f"frame_{self.frames:04d}.png")
+        self.frames += 1
+        return img
+
+    def capture_preview(self) -> Image.Image:
+        return self.backend.capture_preview()
+
+    def size(self):
+        return self.backend.size()
+
+def replay_capture(session_dir: str) -> capture.FakeCapture:
+    frames = [Image.open(path) for path in sorted(Path(session_dir).glob("frame_*.png"))]
+    return capture.FakeCapture(frames or None)
+
+def recorded_replies(session_dir: str) -> Callable[[], str]:
+    replies = list(json.loads((Path(session_dir) / SESSION_FILE).read_text()).get("user_replies", []))
+    return lambda: replies.pop(0) if replies else "exit"
+
+def record_session(user_instructions: str, session_dir: str, computer: Optional[tool.Computer] = None, **kwargs: Any) -> None:
+    import agent
+    computer = computer or tool.get_computer()
+    computer.capture = RecordingCapture(computer.capture, session_dir)
+
+    session = {
+        "instructions": user_instructions,
+        "screen_size": list(computer.capture.size()),
+        "scale_factor": computer.capture.scale_factor,
+        "user_replies": [],
+    }
+
+    def ask_user() -> str:
+        reply = input("\nYou: ").strip()
+        session["user_replies"].append(reply)
+        return reply
+
+    client = RecordingClient(agent.make_client(), session_dir)
+    try:
+        # the clients here only record and replay whole messages, so never stream (AGENT_STREAM)
+        agent.run_agent_loop(user_instructions, computer, client=client, ask_user=ask_user, stream=False, **kwargs)
+    finally:
+        (Path(session_dir) / SESSION_FILE).write_text(json.dumps(session, indent=1))
+
+def replay_session(session_dir: str, **kwargs: Any) -> tool.Computer:
+    import agent
+    session = json.loads((Path(session_dir) / SESSION_FILE).read_text())
+    backend = replay_capture(session_dir)
+    backend.scale_factor = session.get("scale_factor", 1.0)
+
+    computer = tool.Computer(backend, inputs.FakeInput())
+    # recorded frames do not change while we wait, so skip settle polling
+    computer.settle_times = {action: (0.0, 0.0) for action in tool.ACTIONS}
+
+    agent.run_agent_loop(session["instructions"], computer, client=ReplayClient(session_dir),
+                         ask_user=recorded_replies(session_dir), stream=False, **kwargs)
+    return computer
+
+if __name__ == "__main__":
+    if len(sys.argv) >= 4 and sys.argv[1] == "record":
+        record_session(sys.argv[2], sys.argv[3])
+    elif len(sys.argv) >= 3 and sys.argv[1] == "replay":
+        replay_session(sys.argv[2], trace_path=sys.argv[3] if len(sys.argv) > 3 else None)
+    else:
+        print("usage: replay.py record <instructions> <session_dir>")
+        print("       replay.py replay <session_dir> [trace.jsonl]")
+        sys.exit(1)
@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import batch
+
+# parallel multi-session runner: each session gets its own Xvfb display with
+# its own capture and input backend and runs in a worker process. most of a
+# session's wall-clock time is spent waiting on the model, so running several
+# at once multiplies throughput
+
+BASE_DISPLAY = 10
+DEFAULT_SCREEN = "1280x800x24"
+DEFAULT_CONCURRENCY = 4
+XVFB_START_TIMEOUT = 10.0
+# caps per step, so a model that never finishes cannot hold a worker forever
+DEFAULT_MAX_TURNS = batch.DEFAULT_MAX_TURNS
+DEFAULT_TIMEOUT = batch.DEFAULT_TIMEOUT
+
+class VirtualDisplay:
+    def __init__(self, number: int, screen: str = DEFAULT_SCREEN):
+        self.number = number
+        self.screen = screen
+        self.name = f":{number}"
+        self.proc: Optional[subprocess.Popen] = None
+
+    def __enter__(self) -> "VirtualDisplay":
+        if not shutil.which("Xvfb"):
+            raise RuntimeError("Xvfb not found on PATH, parallel sessions need a virtual X server")
+        # a socket or lock left by another server (or a crashed run) would make
+        # the session drive a screen that is not its own
+        socket = Path(f"/tmp/.X11-unix/X{self.number}")
+        lock = Path(f"/tmp/.X{self.number}-lock")
+        if socket.exists() or lock.exists():
+            raise RuntimeError(f"display {self.name} is already in use (remove {lock} and {socket} if it is stale)")
+        self.proc = subprocess.Popen(
+            ["Xvfb", self.name, "-screen", "0", self.screen, "-nolisten", "tcp"],
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+        )
+        deadline = time.monotonic() + XVFB_START_TIMEOUT
+        while not socket.exists():
+            if self.proc.poll() is not None or time.monotonic() > deadline:
+                self.__exit__(None, None, None)
+                raise RuntimeError(f"Xvfb {self.name} failed to start")
+            time.sleep(0.05)
+        # the socket can still belong to a server that started in between, ours then exits
+        time.sleep(0.1)
+        if self.proc.poll() is not None:
+            raise RuntimeError(f"Xvfb {self.name} exited, the display is probably in use")
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        if self.proc and self.proc.poll() is None:
+            self.proc.terminate()
+            try:
+                self.proc.wait(timeout=5)
+            except subprocess.TimeoutExpired:
+                self.proc.kill()
+
+    def env(self) -> Dict[str, str]:
+        return {**os.environ, "DISPLAY": self.name}
+
+def run_session(session_id: int, instructions: List[str], display_number: int, screen: str = DEFAULT_SCREEN,
+                setup_command: Optional[str] = None, trace_dir: Optional[str] = None,
+                max_turns: Optional[int] = DEFAULT_MAX_TURNS, timeout: Optional[float] = DEFAULT_TIMEOUT) -> Dict[str, Any]:
+    # runs in a worker process: one display, one computer, its instructions in order
+    import agent
+    import capture
+    import inputs
+    import tool
+
+    start = time.monotonic()
+    result = {"session": session_id, "display": display_number, "steps": len(instructions), "completed": 0}
+    try:
+        with VirtualDisplay(display_number, screen) as display:
+            app = subprocess.Popen(setup_command, shell=True, env=display.env()) if setup_command else None
+            computer = tool.Computer(capture.X11Capture(display.name), inputs.X11Input(display.name))
+            try:
+                for step, step_instructions in enumerate(instructions):
+                    trace_path = str(Path(trace_dir) / f"session_{session_id}_step_{step}.jsonl") if trace_dir else None
+                    # nobody is at the terminal to answer, a step ends when the model stops acting
+                    # and its completion marker decides whether the session carries on (see batch.py)
+                    status: Dict[str, Any] = {}
+                    finished = agent.run_agent_loop(step_instructions + batch.COMPLETION_PROMPT, computer,
+                                                    trace_path=trace_path, ask_user=lambda: "exit",
+                                                    max_turns=max_turns, timeout=timeout, status=status)
+                    if not finished or status["stop"] in ("max_turns", "timeout", "api_error"):
+                        outcome, reason = status["stop"] or "error", f"stopped after {status['turns']} turns"
+                    else:
+                        outcome, reason = batch.detect_outcome(status["final_text"])
+                    if outcome != "success":
+                        result["status"], result["error"] = outcome, f"step {step}: {reason}"
+                        break
+                    result["completed"] += 1
+            finally:
+                computer.input.close()
+                if app and app.poll() is None:
+                    app.terminate()
+        result.setdefault("status", "ok")
+    except Exception as e:
+        result["status"] = "error"
+        result["error"] = f"{e}\n{traceback.format_exc()}"
+    result["duration"] = time.monotonic() - start
+    return result
+
+def run_sessions(sessions: List[List[str]], concurrency: int = DEFAULT_CONCURRENCY, base_display: int = BASE_DISPLAY,
+                 screen: str = DEFAULT_SCREEN, setup_command: Optional[str] = None,
+                 trace_dir: Optional[str] = None, max_turns: Optional[int] = DEFAULT_MAX_TURNS,
+                 timeout: Optional[float] = DEFAULT_TIMEOUT) -> List[Dict[str, Any]]:
+    if trace_dir:
+        Path(trace_dir).mkdir(parents=True, exist_ok=True)
+    results = []
+    with ProcessPoolExecutor(max_workers=concurrency) as pool:
+        # every session gets its own display number, so sessions never share a screen
+        futures = [
+            pool.submit(run_session, idx, instructions, base_display + idx, screen, setup_command, trace_dir,
+                        max_turns, timeout)
+            for idx, instructions in enumerate(sessions)
+        ]
+        for future in as_completed(futures):
+            result = future.result()
+            print(f"session {result['session']} on :{result['display']}: {result['status']} "
+                  f"({result['completed']}/{result['steps']} steps, {result['duration']:.1f}s)")
+            results.append(result)
+    return sorted(results, key=lambda r: r["session"])
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="run agent sessions in parallel, one Xvfb display each")
+    parser.add_argument("sessions", help="JSON file with a list of sessions, each a list of instructions run in order")
+    parser.add_argument("--concurrency", type=int, default=DEFAULT_CONCURRENCY)
+    parser.add_argument("--base-display", type=int, default=BASE_DISPLAY)
+    parser.add_argument("--screen", default=DEFAULT_SCREEN, help="Xvfb screen geometry, WxHxDEPTH")
+    parser.add_argument("--setup", help="command started inside each display first, e.g. a browser")
+    parser.add_argument("--trace-dir", help="write one trace file per session step here")
+    parser.add_argument("--max-turns", type=int, default=DEFAULT_MAX_TURNS, help="model turns per step")
+    parser.add_argument("--timeout", type=float, default=DEFAULT_TIMEOUT, help="seconds per step")
+    args = parser.parse_args()
+
+    sessions = json.loads(Path(args.sessions).read_text())
+    results = run_sessions(sessions, args.concurrency, args.base_display, args.screen, args.setup, args.trace_dir,
+                           args.max_turns, args.timeout)
+    failed = [r for r in results if r["status"] != "ok"]
+    print(f"{len(results) - len(failed)}/{len(results)} sessions finished")
+    for r in failed:
+        print(f"session {r['session']} failed: {r['error']}")
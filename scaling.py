@@ -0,0 +1,48 @@
+#!/usr/bin/env python3
+
+from typing import Optional, Tuple
+
+# screenshots are resized once to fit an api target and every coordinate the
+# model sends is mapped back to the input driver's space (physical pixels
+# divided by the display scale factor, i.e. points on a retina mac)
+
+SCALE_TARGETS = {
+    "XGA": (1024, 768),
+    "WXGA": (1280, 800),
+    "FWXGA": (1366, 768),
+}
+DEFAULT_TARGET = "WXGA"
+
+def fit_size(screen_size: Tuple[int, int], bounds: Tuple[int, int]) -> Tuple[int, int]:
+    # largest size inside bounds that keeps the screen aspect ratio, never upscaled
+    width, height = screen_size
+    ratio = min(bounds[0] / width, bounds[1] / height, 1.0)
+    return max(1, round(width * ratio)), max(1, round(height * ratio))
+
+class Scaler:
+    def __init__(self, screen_size: Tuple[int, int], scale_factor: float = 1.0, target: Optional[str] = DEFAULT_TARGET):
+        self.screen_size = screen_size
+        self.scale_factor = scale_factor
+        if target is None:
+            self.api_size = screen_size
+        elif target in SCALE_TARGETS:
+            self.api_size = fit_size(screen_size, SCALE_TARGETS[target])
+        else:
+            raise ValueError(f"unknown scale target {target!r}, expected one of {sorted(SCALE_TARGETS)}")
+
+        self.x_ratio = screen_size[0] / self.api_size[0]
+        self.y_ratio = screen_size[1] / self.api_size[1]
+
+    # api -> capture pixels
+    def to_pixels(self, x: float, y: float) -> Tuple[int, int]:
+        return round(x * self.x_ratio), round(y * self.y_ratio)
+
+    # api -> input driver coordinates
+    def to_screen(self, x: float, y: float) -> Tuple[int, int]:
+        return (round(x * self.x_ratio / self.scale_factor),
+                round(y * self.y_ratio / self.scale_factor))
+
+    # input driver coordinates -> api
+    def to_api(self, x: float, y: float) -> Tuple[int, int]:
+        return (round(x * self.scale_factor / self.x_ratio),
+                round(y * self.scale_factor / self.y_ratio))
@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+
+import os
+import re
+import time
+from collections import deque
+from pathlib import Path
+from typing import Deque, Optional, Tuple
+from uuid import uuid4
+
+# optional on-disk screenshot log for debugging: the encoded image sent to the
+# model is written as <session>_t<turn>_<n>.<ext>, so files line up with the
+# conversation turns, and the oldest files are deleted once the directory
+# goes over a file count or byte cap
+
+DEFAULT_MAX_FILES = 500
+EXTENSIONS = {"image/jpeg": "jpg", "image/png": "png", "image/webp": "webp"}
+# names this ring writes, only these are ever deleted from the directory
+RING_FILE = re.compile(r"\d{8}-\d{6}-[0-9a-f]{6}_t\d{4,}_\d+\.(jpg|png|webp|bin)")
+
+def new_session_id() -> str:
+    return time.strftime("%Y%m%d-%H%M%S") + "-" + uuid4().hex[:6]
+
+class ScreenshotRing:
+    def __init__(self, path: str, max_files: Optional[int] = DEFAULT_MAX_FILES, max_bytes: Optional[int] = None):
+        self.dir = Path(path)
+        self.dir.mkdir(parents=True, exist_ok=True)
+        self.max_files = max_files
+        self.max_bytes = max_bytes
+        self.session = new_session_id()
+        self._seq = 0
+        self._turn = -1
+        # ring files left by earlier runs count towards the caps, oldest first;
+        # anything else in the directory is left alone
+        existing = sorted((entry.stat().st_mtime, entry.path, entry.stat().st_size)
+                          for entry in os.scandir(self.dir) if entry.is_file() and RING_FILE.fullmatch(entry.name))
+        self._files: Deque[Tuple[Path, int]] = deque((Path(path), size) for _, path, size in existing)
+        self.bytes = sum(size for _, size in self._files)
+        self._evict()
+
+    def new_session(self, session: Optional[str] = None) -> str:
+        self.session = session or new_session_id()
+        self._turn = -1
+        return self.session
+
+    def save(self, data: bytes, turn: int, media_type: str = "image/jpeg") -> Path:
+        if turn != self._turn:
+            self._turn, self._seq = turn, 0
+        path = self.dir / f"{self.session}_t{turn:04d}_{self._seq}.{EXTENSIONS.get(media_type, 'bin')}"
+        self._seq += 1
+        path.write_bytes(data)
+        self._files.append((path, len(data)))
+        self.bytes += len(data)
+        self._evict()
+        return path
+
+    def _over(self) -> bool:
+        return (self.max_files is not None and len(self._files) > self.max_files) or \
+            (self.max_bytes is not None and self.bytes > self.max_bytes)
+
+    def _evict(self) -> None:
+        while self._files and self._over():
+            path, size = self._files.popleft()
+            try:
+                path.unlink()
+            except FileNotFoundError:
+                pass
+            self.bytes -= size
@@ -0,0 +1,47 @@
+#!/usr/bin/env python3
+
+import time
+from typing import Dict, Tuple
+import capture
+import framediff
+
+# adaptive "wait until stable": after an action, poll cheap preview frames and
+# stop once consecutive frames match, bounded by a per-action (min, max) wait
+
+# (min_wait, max_wait) in seconds per action type
+SETTLE_TIMES: Dict[str, Tuple[float, float]] = {
+    "left_click": (0.1, 3.0),
+    "double_click": (0.1, 3.0),
+    "right_click": (0.05, 1.5),
+    "middle_click": (0.05, 1.5),
+    "left_click_drag": (0.05, 1.5),
+    "key": (0.05, 2.0),
+    "type": (0.05, 1.5),
+    "scroll": (0.05, 1.0),
+    "mouse_move": (0.0, 0.5),
+    "cursor_position": (0.0, 0.0),
+    "screenshot": (0.0, 0.0),
+    "zoom": (0.0, 0.0),
+}
+DEFAULT_SETTLE = (0.0, 1.0)
+POLL_INTERVAL = 0.1
+# consecutive identical preview frames that count as settled
+STABLE_FRAMES = 2
+
+def wait_for_settle(backend: capture.CaptureBackend, min_wait: float, max_wait: float,
+                    interval: float = POLL_INTERVAL, stable_frames: int = STABLE_FRAMES) -> float:
+    # returns the seconds spent waiting
+    start = time.monotonic()
+    if min_wait > 0:
+        time.sleep(min_wait)
+    if max_wait <= min_wait:
+        return time.monotonic() - start
+
+    last = framediff.fingerprint(backend.capture_preview())
+    matches = 1
+    while matches < stable_frames and time.monotonic() - start < max_wait:
+        time.sleep(interval)
+        current = framediff.fingerprint(backend.capture_preview())
+        matches = matches + 1 if current == last else 1
+        last = current
+    return time.monotonic() - start
@@ -1,39 +1,35 @@
 #!/usr/bin/env python3
 
-import subprocess
 import time
-import shutil
 import sys
 
+import inputs
+
+# smoke test for the input backend: moves the mouse to (1, 1) and clicks there
 def main():
-    cliclick_path = shutil.which("cliclick")
-    if not cliclick_path:
-        print("Error: 'cliclick' not found on PATH.")
-        print("       Check that brew (or your install method) put cliclick in /usr/local/bin or /opt/homebrew/bin, etc.")
+    try:
+        driver = inputs.default_input_driver()
+    except Exception as e:
+        print(f"Error: no input backend available: {e}")
+        print("       On macOS install pyobjc-framework-Quartz, on Linux python-xlib (see requirements.txt).")
         sys.exit(1)
-    print(f"'cliclick' found at: {cliclick_path}")
-
-   
-    move_cmd = "cliclick m:1,1"
-    proc = subprocess.run(move_cmd, shell=True, capture_output=True)
+    print(f"input backend: {type(driver).__name__}")
 
-    if proc.returncode != 0:
-        print("Error moving mouse:")
-        print(proc.stderr.decode("utf-8"))
-    else:
+    try:
+        driver.move(1, 1)
         print("Mouse moved to (1, 1).")
+    except Exception as e:
+        print(f"Error moving mouse: {e}")
     time.sleep(1)
 
-    click_cmd = "cliclick c:1,1"
-    print(f"Running: {click_cmd}")
-    proc = subprocess.run(click_cmd, shell=True, capture_output=True)
-
-    if proc.returncode != 0:
-        print("Error clicking mouse:")
-        print(proc.stderr.decode("utf-8"))
-    else:
+    print("Clicking at (1, 1)")
+    try:
+        driver.click()
         print("Clicked at (1, 1).")
+    except Exception as e:
+        print(f"Error clicking mouse: {e}")
 
+    driver.close()
     print("Test complete.")
 
 if __name__ == "__main__":
@@ -1,348 +1,433 @@
 #!/usr/bin/env python3
 
-import base64
-import shlex
-from pathlib import Path
-from typing import List, Optional, Dict, Any
-from uuid import uuid4
-import base64
-import io
-from PIL import Image
-import subprocess
-import time
-import pyautogui
-
-# anthropic import
-from anthropic import Anthropic, APIError
-from anthropic.types.beta import (
-    BetaMessage,
-    BetaMessageParam,
-    BetaToolResultBlockParam,
-)
+import os
+from typing import TYPE_CHECKING, Any, Dict, List, Optional
+import capture
+import encoder
+import framediff
+import imagestore
+import inputs
+import scaling
+import settle
+import tracing
+
+# PIL is only imported when a screenshot is processed
+if TYPE_CHECKING:
+    from PIL import Image
 
 VERBOSE = True
-# on my computer I have to adjust Claude's coordiantes?? to get the correct position
-OFFSET = 1.25
 
-def run_shell(cmd: str, timeout: float = 120.0) -> (int, str, str):
-    if VERBOSE:
-        print(f"running: {cmd}")
-    try:
-        proc = subprocess.run(
-            cmd, shell=True, capture_output=True, timeout=timeout
-        )
-        rc = proc.returncode or 0
-        stdout = proc.stdout.decode(errors="replace")
-        stderr = proc.stderr.decode(errors="replace")
-        return rc, stdout, stderr
-    except subprocess.TimeoutExpired:
-        return -1, "", f"command {cmd} timed out"
-
-def compress_screenshot(png_b64_data: str, quality=50) -> str:
-    # compress screenshot to jpeg
-    png_bytes = base64.b64decode(png_b64_data)
-    img = Image.open(io.BytesIO(png_bytes))
-    
-    # Store original dimensions
-    original_width, original_height = img.size
-    
-    if img.mode == "RGBA":
-        # Convert to RGB while maintaining dimensions
-        img = img.convert("RGB")
-    
-    img = img.resize((original_width, original_height), Image.Resampling.LANCZOS)
-
-    buf = io.BytesIO()
-    img.save(buf, format="JPEG", quality=quality)
-    compressed_data = buf.getvalue()
-    return base64.b64encode(compressed_data).decode("utf-8")
+# zoom without a region shows this window (api pixels) around the cursor
+ZOOM_WINDOW = (400, 250)
+# with AGENT_FOCUS_CROP=1 these actions get a crop around the cursor instead of a full frame
+FOCUS_CROP_ACTIONS = {"type", "key"}
+FOCUS_CROP = os.getenv("AGENT_FOCUS_CROP", "") == "1"
+# fraction of the 160x100 fingerprint cells that may change while a frame still counts
+# as unchanged (see framediff.py). 0 by default: one cell is about a typed character or a
+# ticked checkbox, so a tolerance also hides small real changes. around 0.001 (16 cells)
+# ignores a blinking caret or a clock
+DIFF_THRESHOLD = float(os.getenv("AGENT_DIFF_THRESHOLD", "0"))
+
+# bundles the backends a tool call runs against, one per screen/session
+class Computer:
+    def __init__(self, capture_backend: Optional[capture.CaptureBackend] = None,
+                 input_driver: Optional[inputs.InputDriver] = None, diff_threshold: float = DIFF_THRESHOLD,
+                 scale_target: Optional[str] = scaling.DEFAULT_TARGET):
+        self.capture = capture_backend or capture.default_capture_backend()
+        self.input = input_driver or inputs.default_input_driver(getattr(self.capture, "display", None))
+        self.differ = framediff.FrameDiffer(diff_threshold)
+        # picks format and quality per screenshot, see encoder.py
+        self.encoder = encoder.Encoder()
+        # per-action (min, max) settle waits before the screenshot, see settle.py
+        self.settle_times = dict(settle.SETTLE_TIMES)
+        # per-turn phase timings, replaced by the agent loop with one that writes a trace file
+        self.tracer = tracing.Tracer()
+        # screenshots sent in tool results, replaced by the agent loop with one per session
+        self.images = imagestore.ImageStore()
+        # actions answered with a crop around the cursor, see crop_region
+        self.focus_crop_actions = set(FOCUS_CROP_ACTIONS) if FOCUS_CROP else set()
+        # optional on-disk copy of every screenshot sent, see screenshots.ScreenshotRing
+        self.screenshots = None
+        # notified after every finished batch, see trajectory.TrajectoryRecorder
+        self.recorder = None
+        self.scale_target = scale_target
+        self._scaler: Optional[scaling.Scaler] = None
+
+    @property
+    def display_number(self) -> Optional[int]:
+        # X11 display the session is bound to, None for the physical screen
+        display = getattr(self.capture, "display", None)
+        if not display or ":" not in display:
+            return None
+        try:
+            return int(display.split(":", 1)[1].split(".", 1)[0])
+        except ValueError:
+            return None
+
+    @property
+    def scaler(self) -> scaling.Scaler:
+        if self._scaler is None:
+            self._scaler = scaling.Scaler(self.capture.size(), self.capture.scale_factor, self.scale_target)
+        return self._scaler
+
+_default_computer: Optional[Computer] = None
+
+def get_computer() -> Computer:
+    global _default_computer
+    if _default_computer is None:
+        _default_computer = Computer()
+    return _default_computer
+
+def set_computer(computer: Computer) -> None:
+    global _default_computer
+    _default_computer = computer
 
 # screenshot tool
-def screenshot_mac() -> Optional[str]:
-    output_dir = Path("/tmp/outputs")
-    output_dir.mkdir(parents=True, exist_ok=True)
-    screenshot_path = output_dir / f"screenshot_{uuid4().hex}.png"
-
-    cmd = f"screencapture -x {shlex.quote(str(screenshot_path))}"
-    rc, out, err = run_shell(cmd)
-    if rc != 0 or not screenshot_path.is_file():
+def take_screenshot(computer: Optional[Computer] = None) -> Optional["Image.Image"]:
+    computer = computer or get_computer()
+    try:
+        with computer.tracer.phase("capture"):
+            return computer.capture.capture()
+    except Exception as e:
+        if VERBOSE:
+            print(f"screenshot failed: {e}")
         return None
 
-    return base64.b64encode(screenshot_path.read_bytes()).decode("utf-8")
-
-# mouse movement and click tools
-def mouse_move_mac(x: int, y: int) -> (int, str, str):
-    # this is so stupid lmao
-    x = int(x * OFFSET)
-    y = int(y * OFFSET)
-    cmd = f"cliclick m:{x},{y}"
-    return run_shell(cmd)
-
-def left_click_drag_mac(x_end: int, y_end: int) -> (int, str, str):
-    rc, out, err = run_shell("cliclick p")
-    if rc != 0 or not out.strip():
-        return (rc, "", f"could not get current mouse position: {err or out}")
-
-    current_pos = out.strip()
-    if "," not in current_pos:
-        return (rc, "", f"unexpected format: {current_pos}")
-    x_start_str, y_start_str = current_pos.split(",", 1)
-    try:
-        x_start = int(x_start_str)
-        y_start = int(y_start_str)
-    except ValueError as ve:
-        return (rc, "", f"could not parse coords: {ve}")
-
-    dd_cmd = f"cliclick dd:{x_start},{y_start}"
-    rc2, out2, err2 = run_shell(dd_cmd)
-    m_cmd = f"cliclick m:{x_end},{y_end}"
-    rc3, out3, err3 = run_shell(m_cmd)
-    du_cmd = f"cliclick du:{x_end},{y_end}"
-    rc4, out4, err4 = run_shell(du_cmd)
-
-    full_out = f"{out2}\n{err2}\n{out3}\n{err3}\n{out4}\n{err4}"
-    final_rc = rc2 or rc3 or rc4
-    return final_rc, full_out, ""
-
-def get_pos():
-    rc, out, err = run_shell("cliclick p")
-    if rc != 0 or not out.strip():
-        return (rc, "", f"could not get current position: {err or out}")
-    x_str, y_str = out.strip().split(",", 1)
-    return x_str, y_str
-
-def left_click_mac_current() -> (int, str, str):
-    x_str, y_str = get_pos()
-    cmd = f"cliclick c:{x_str},{y_str}"
-    return run_shell(cmd)
-
-def right_click_mac_current() -> (int, str, str):
-    x_str, y_str = get_pos()
-    cmd = f"cliclick rc:{x_str},{y_str}"
-    return run_shell(cmd)
-
-def middle_click_mac_current() -> (int, str, str):
-    x_str, y_str = get_pos()
-    cmd = f"cliclick c:{x_str},{y_str}"
-    return run_shell(cmd)
-
-def double_click_mac_current() -> (int, str, str):
-    x_str, y_str = get_pos()
-    cmd = f"cliclick dc:{x_str},{y_str}"
-    return run_shell(cmd)
-
-def get_cursor_position_mac() -> (int, str, str):
-    return run_shell("cliclick p")
-
-def type_text_mac(text: str) -> (int, str, str):
-    chunk_size = 50
-    all_out = []
-    all_err = []
-    rc_accum = 0
-    for i in range(0, len(text), chunk_size):
-        chunk = text[i : i + chunk_size]
-        cmd = f"cliclick t:{shlex.quote(chunk)}"
-        rc, out, err = run_shell(cmd)
-        rc_accum = rc_accum or rc
-        if out:
-            all_out.append(out)
-        if err:
-            all_err.append(err)
-    return rc_accum, "\n".join(all_out), "\n".join(all_err)
-
-def scroll_mac(pixels: int) -> (int, str, str):
-    num_presses = abs(pixels) // 25
-    key = "arrow-down" if pixels > 0 else "arrow-up"
-    cmd = "cliclick " + " ".join([f"kp:{key} w:50"] * num_presses)
-    
-    return run_shell(cmd)
-
-def key_press_mac(key: str) -> (int, str, str):
+# mouse movement and click tools, driven through the computer's input driver
+# coordinates are already in input (screen point) space, see Scaler.to_screen
+def run_input(fn, *args) -> (int, str, str):
     if VERBOSE:
-        print(f"pressing: {key}")
-    # Map keys to PyAutoGUI format
-    key_mapping = {
-        "return": "enter",
-        "escape": "esc",
-        "arrow-down": "down",
-        "arrow-up": "up",
-        "arrow-left": "left",
-        "arrow-right": "right",
-        "page-down": "pagedown",
-        "page-up": "pageup",
-        "control": "ctrl",
-        "cmd": "command",
-        "option": "alt",
-    }
-    
+        print(f"input: {fn.__name__}{args}")
     try:
-        # Split the input string and remove whitespace
-        keys = [k.strip().lower() for k in key.split("+")]
-        
-        # If it's a single key, use press() as before
-        if len(keys) == 1:
-            pyautogui.press(key_mapping.get(keys[0], keys[0]))
-        # If it's a key combination, use keyDown() and keyUp()
-        else:
-            # Map each key in the combination
-            mapped_keys = [key_mapping.get(k, k) for k in keys]
-            
-            # Hold down all keys in sequence
-            for k in mapped_keys:
-                pyautogui.keyDown(k)
-                
-            # Release all keys in reverse order
-            for k in reversed(mapped_keys):
-                pyautogui.keyUp(k)
-            
+        fn(*args)
         return 0, "", ""
     except Exception as e:
-        return 1, "", str(e)
+        return 1, "", f"input failed: {e}"
+
+SCROLL_DIRECTIONS = {"up": (0, -1), "down": (0, 1), "left": (-1, 0), "right": (1, 0)}
+
+# accepts a pixel amount in 'text' (positive scrolls down), or scroll_direction
+# with scroll_amount in wheel clicks; returns (dx, dy) in pixels or None
+def parse_scroll(tool_input: Dict[str, Any]) -> Optional[tuple]:
+    direction = tool_input.get("scroll_direction")
+    if direction is not None:
+        amount = tool_input.get("scroll_amount", 1)
+        if direction not in SCROLL_DIRECTIONS or not isinstance(amount, int):
+            return None
+        dx, dy = SCROLL_DIRECTIONS[direction]
+        return dx * amount * inputs.PIXELS_PER_CLICK, dy * amount * inputs.PIXELS_PER_CLICK
+    try:
+        return 0, int(tool_input.get("text"))
+    except (TypeError, ValueError):
+        return None
 
-def return_action(tool_use_id: str, output_text: str, error_text: str, img: str):
+def image_block(img: Any) -> Dict[str, Any]:
+    # img is base64 jpeg data or a stored image source from ImageStore.put
+    if isinstance(img, dict):
+        return {"type": "image", "source": img}
+    return {
+        "type": "image",
+        "source": {
+            "type": "base64",
+            "media_type": "image/jpeg",
+            "data": img
+        }
+    }
+
+def return_action(tool_use_id: str, output_text: str, error_text: str, img: Any, is_error: bool = False):
+    content = [
+        {
+            "type": "text",
+            "text": ("RESULT: " + output_text + "\n" + error_text + "\n").strip()
+        }
+    ]
+    # no image when the screenshot failed, was deferred, or the screen has not changed
+    if img:
+        content.append(image_block(img))
+    result = {
+        "type": "tool_result",
+        "tool_use_id": tool_use_id,
+        "content": content,
+    }
+    if is_error:
+        result["is_error"] = True
+    return result
+
+def unknown_action(tool_use_id: str, action: Any):
     return {
         "type": "tool_result",
         "tool_use_id": tool_use_id,
         "content": [
-            {
-                "type": "text",
-                "text": ("RESULT: " + output_text + "\n" + error_text + "\n").strip()
-            },
-            {
-                "type": "image",
-                "source": {
-                    "type": "base64",
-                    "media_type": "image/jpeg",
-                    "data": img or ""
-                }
-            }
+            {"type": "text", "text": f"[error] unrecognized action: {action}"}
         ],
+        "is_error": True
     }
-    
 
-# main computer use loop
-def handle_computer_tool_use(tool_input: Dict[str, Any]) -> BetaToolResultBlockParam:
+ACTIONS = {
+    "mouse_move", "left_click_drag", "screenshot", "cursor_position", "left_click", "right_click",
+    "middle_click", "double_click", "key", "type", "scroll", "zoom",
+}
+
+def valid_region(region: Any) -> bool:
+    return isinstance(region, list) and len(region) == 4 and all(isinstance(v, (int, float)) for v in region) \
+        and region[0] < region[2] and region[1] < region[3]
+
+def zoom_region(region: Any, computer: Computer) -> Optional[List[int]]:
+    # the region rounded and clamped to the api screen, None if nothing usable is left
+    if not valid_region(region):
+        return None
+    width, height = computer.scaler.api_size
+    x0, y0, x1, y1 = (round(v) for v in region)
+    x0, y0, x1, y1 = max(0, x0), max(0, y0), min(width, x1), min(height, y1)
+    return [x0, y0, x1, y1] if x0 < x1 and y0 < y1 else None
+
+def cursor_window(computer: Computer, window: tuple = ZOOM_WINDOW) -> List[int]:
+    # window around the cursor in api pixels, shifted to stay on screen
+    x, y = computer.scaler.to_api(*computer.input.cursor_position())
+    width, height = computer.scaler.api_size
+    w, h = min(window[0], width), min(window[1], height)
+    x0 = min(max(0, x - w // 2), width - w)
+    y0 = min(max(0, y - h // 2), height - h)
+    return [x0, y0, x0 + w, y0 + h]
+
+# the part of the screen (api pixels) an action's screenshot is cropped to, None for the full frame
+def crop_region(tool_input: Dict[str, Any], computer: Computer) -> Optional[List[int]]:
+    action = tool_input.get("action")
+    try:
+        if action == "zoom":
+            region = tool_input.get("region")
+            # an unusable region has already failed the action, it gets the full frame
+            return cursor_window(computer) if region is None else zoom_region(region, computer)
+        if action in computer.focus_crop_actions:
+            return cursor_window(computer)
+    except Exception as e:
+        if VERBOSE:
+            print(f"could not find the crop region: {e}")
+    return None
+
+# runs one action without taking a screenshot
+def perform_action(tool_input: Dict[str, Any], computer: Computer) -> (int, str, str):
     action = tool_input.get("action")
     text = tool_input.get("text")
     coord = tool_input.get("coordinate")
-    tool_use_id = tool_input.get("id", "missing_id")
-
-    output_text = ""
-    error_text = ""
-
-    def do_screenshot():
-        img = screenshot_mac()
-        if not img:
-            return None, "[error] screenshot failed"
-        compressed_img = compress_screenshot(img, quality=50)
-        return compressed_img, ""
 
     if action == "mouse_move":
         if not isinstance(coord, list) or len(coord) != 2:
-            error_text += "[error] 'mouse_move' requires a 2-element list\n"
-        else:
-            x, y = coord
-            rc, out, err = mouse_move_mac(x, y)
-            if out: output_text += out
-            if err: error_text += err
-            
-            img, shot_err = do_screenshot()
-            if shot_err: error_text += shot_err
-    
+            return 1, "", "[error] 'mouse_move' requires a 2-element list\n"
+        x, y = computer.scaler.to_screen(*coord)
+        return run_input(computer.input.move, x, y)
+
     elif action == "left_click_drag":
         if not isinstance(coord, list) or len(coord) != 2:
-            error_text += "[error] 'left_click_drag' requires 2-element list\n"
-        else:
-            x_end, y_end = coord
-            rc, out, err = left_click_drag_mac(x_end, y_end)
-            if out: output_text += out
-            if err: error_text += err
-            
-            img, shot_err = do_screenshot()
-            if shot_err: error_text += shot_err
-            
+            return 1, "", "[error] 'left_click_drag' requires 2-element list\n"
+        x_end, y_end = computer.scaler.to_screen(*coord)
+        return run_input(computer.input.drag, x_end, y_end)
+
     elif action == "screenshot":
-        img, shot_err = do_screenshot()
-        if shot_err: error_text += shot_err
+        return 0, "", ""
+
+    elif action == "zoom":
+        region = tool_input.get("region")
+        if region is not None and zoom_region(region, computer) is None:
+            width, height = computer.scaler.api_size
+            return 1, "", (f"[error] 'zoom' region must be [x0, y0, x1, y1] with x0 < x1 and y0 < y1, "
+                           f"overlapping the {width}x{height} screen\n")
+        return 0, "", ""
 
     elif action == "cursor_position":
-        rc, out, err = get_cursor_position_mac()
-        if out: output_text += out
-        if err: error_text += err
-        
-        img, shot_err = do_screenshot()
-        if shot_err: error_text += shot_err
+        try:
+            # report the position in the same space the model clicks in
+            x, y = computer.scaler.to_api(*computer.input.cursor_position())
+            return 0, f"{x},{y}", ""
+        except Exception as e:
+            return 1, "", f"could not get current position: {e}"
 
     elif action == "left_click":
-        rc, out, err = left_click_mac_current()
-        if out: output_text += out
-        if err: error_text += err   
-        time.sleep(2)
-        img, shot_err = do_screenshot()
-        if shot_err: error_text += shot_err
+        return run_input(computer.input.click)
 
     elif action == "right_click":
-        rc, out, err = right_click_mac_current()
-        if out: output_text += out
-        if err: error_text += err
-        
-        img, shot_err = do_screenshot()
-        if shot_err: error_text += shot_err
+        return run_input(computer.input.click, "right")
 
     elif action == "middle_click":
-        rc, out, err = middle_click_mac_current()
-        if out: output_text += out
-        if err: error_text += err
-        
-        img, shot_err = do_screenshot()
-        if shot_err: error_text += shot_err
+        return run_input(computer.input.click, "middle")
 
     elif action == "double_click":
-        rc, out, err = double_click_mac_current()
-        if out: output_text += out
-        if err: error_text += err
-        
-        img, shot_err = do_screenshot()
-        if shot_err: error_text += shot_err
+        return run_input(computer.input.click, "left", 2)
 
     elif action == "key":
         if not isinstance(text, str):
-            error_text += "[error] 'key' must have 'text'\n"
-        else:
-            rc, out, err = key_press_mac(text)
-            if out: output_text += out
-            if err: error_text += err
-            
-            img, shot_err = do_screenshot()
-            if shot_err: error_text += shot_err
+            return 1, "", "[error] 'key' must have 'text'\n"
+        return run_input(computer.input.key, text)
 
     elif action == "type":
         if not isinstance(text, str):
-            error_text += "[error] 'type' must have 'text'\n"
-        else:
-            rc, out, err = type_text_mac(text)
-            if out: output_text += out
-            if err: error_text += err
-            
-            img, shot_err = do_screenshot()
-            if shot_err: error_text += shot_err
+            return 1, "", "[error] 'type' must have 'text'\n"
+        return run_input(computer.input.type_text, text)
 
     elif action == "scroll":
-        if not isinstance(text, int):
-            error_text += "[error] 'scroll' must have 'text'\n"
-        else:
-            rc, out, err = scroll_mac(text)
-            if out: output_text += out
-            if err: error_text += err
+        delta = parse_scroll(tool_input)
+        if delta is None:
+            return 1, "", "[error] 'scroll' needs a pixel amount in 'text' or scroll_direction/scroll_amount\n"
+        if coord is not None:
+            if not isinstance(coord, list) or len(coord) != 2:
+                return 1, "", "[error] 'scroll' coordinate must be a 2-element list\n"
+            rc, out, err = run_input(computer.input.move, *computer.scaler.to_screen(*coord))
+            if rc != 0:
+                return rc, out, err
+        return run_input(computer.input.scroll, *delta)
+
+    return 1, "", f"[error] unrecognized action: {action}"
+
+def settle_after(action: str, computer: Computer) -> Optional[float]:
+    min_wait, max_wait = computer.settle_times.get(action, settle.DEFAULT_SETTLE)
+    if max_wait <= 0:
+        return None
+    try:
+        with computer.tracer.phase("settle"):
+            return settle.wait_for_settle(computer.capture, min_wait, max_wait)
+    except Exception as e:
+        if VERBOSE:
+            print(f"settle detection failed: {e}")
+        return None
+
+# cuts a region given in api pixels out of the full-resolution capture, returns
+# the crop, the size to send it at and a note that maps it back to the screen
+def crop_screenshot(img: "Image.Image", region: List[int], computer: Computer, action: str) -> ("Image.Image", tuple, str):
+    scaler = computer.scaler
+    x0, y0 = scaler.to_pixels(region[0], region[1])
+    x1, y1 = scaler.to_pixels(region[2], region[3])
+    crop = img.crop((max(0, x0), max(0, y0), min(img.width, x1), min(img.height, y1)))
+    if action == "zoom":
+        # full detail, but never larger than a full screenshot
+        size = scaling.fit_size(crop.size, scaler.api_size)
     else:
-        # no recognized action
-        return {
-            "type": "tool_result",
-            "tool_use_id": tool_use_id,
-            "content": [
-                {"type": "text", "text": f"[error] unrecognized action: {action}"}
-            ],
-            "is_error": True
-        }
+        # focus crops are a cheap check, sent at the scale of a normal screenshot
+        size = (region[2] - region[0], region[3] - region[1])
+    zoom = size[0] / (region[2] - region[0])
+    where = "zoomed on" if action == "zoom" else "showing only the area around the cursor,"
+    note = (f"{where} screen region ({region[0]},{region[1]})-({region[2]},{region[3]}) at {zoom:.1f}x; "
+            f"coordinates for actions are still full-screen")
+    return crop, size, note
+
+# waits for the screen to settle and captures it, returns (img, output, error)
+# the image is a source referencing the computer's image store; with a region
+# (api pixels) only that part of the screen is sent
+def screenshot_after(action: str, computer: Computer, region: Optional[List[int]] = None) -> (Optional[Dict[str, Any]], str, str):
+    settle_time = settle_after(action, computer)
+    output_text = f"settled after {settle_time:.2f}s" if settle_time is not None else ""
+
+    img = take_screenshot(computer)
+    if img is None:
+        return None, output_text, "[error] screenshot failed"
+    # an explicit screenshot or zoom request always gets an image back
+    with computer.tracer.phase("diff"):
+        unchanged = action not in ("screenshot", "zoom") and computer.differ.is_unchanged(img)
+        # a crop does not show the model the full frame, so it does not count as sent
+        if not unchanged and region is None:
+            computer.differ.mark_sent(img)
+    if unchanged:
+        computer.differ.skipped += 1
+        return None, output_text, framediff.UNCHANGED_TEXT
+    size = computer.scaler.api_size
+    if region is not None:
+        img, size, note = crop_screenshot(img, region, computer, action)
+        output_text = join_text(output_text, note)
+    with computer.tracer.phase("encode"):
+        data, media_type, size = computer.encoder.encode(img, size)
+    computer.tracer.add_bytes("image", imagestore.b64_len(len(data)))
+    if computer.screenshots is not None:
+        try:
+            computer.screenshots.save(data, computer.tracer.turn, media_type)
+        except OSError as e:
+            if VERBOSE:
+                print(f"saving screenshot failed: {e}")
+    return computer.images.put(data, media_type, size), output_text, ""
+
+def join_text(*parts: str) -> str:
+    return "\n".join(part.strip("\n") for part in parts if part and part.strip("\n"))
 
-    return return_action(tool_use_id, output_text, error_text, img)
\ No newline at end of file
+# main computer use loop
+def handle_computer_tool_use(tool_input: Dict[str, Any], computer: Optional[Computer] = None) -> Dict[str, Any]:
+    computer = computer or get_computer()
+    action = tool_input.get("action")
+    tool_use_id = tool_input.get("id", "missing_id")
+    if action not in ACTIONS:
+        return unknown_action(tool_use_id, action)
+
+    computer.tracer.action(action)
+    with computer.tracer.phase("input"):
+        rc, output_text, error_text = perform_action(tool_input, computer)
+    img, shot_out, shot_err = screenshot_after(action, computer, crop_region(tool_input, computer))
+    output_text = join_text(output_text, shot_out)
+    error_text = join_text(error_text, shot_err)
+
+    return return_action(tool_use_id, output_text, error_text, img, is_error=rc != 0)
+
+# runs all computer actions of one response back to back; only the final
+# screen state matters, so only the last result gets a screenshot
+class ActionBatch:
+    def __init__(self, computer: Optional[Computer] = None):
+        self.computer = computer or get_computer()
+        self.results: List[Dict[str, Any]] = []
+        self.inputs: List[Dict[str, Any]] = []
+        self.last_action: Optional[str] = None
+        self.succeeded = 0
+        self.failed = False
+
+    def run(self, tool_input: Dict[str, Any]) -> Dict[str, Any]:
+        action = tool_input.get("action")
+        tool_use_id = tool_input.get("id", "missing_id")
+
+        if action not in ACTIONS:
+            result = unknown_action(tool_use_id, action)
+            self.failed = True
+        elif self.failed:
+            # the rest of the plan assumed the earlier action worked
+            result = return_action(tool_use_id, "", "[skipped] an earlier action in this batch failed", None, is_error=True)
+        else:
+            # let the previous action land before the next one
+            if self.last_action:
+                settle_after(self.last_action, self.computer)
+            self.computer.tracer.action(action)
+            with self.computer.tracer.phase("input"):
+                rc, output_text, error_text = perform_action(tool_input, self.computer)
+            self.inputs.append(tool_input)
+            self.last_action = action
+            if rc == 0:
+                self.succeeded += 1
+            else:
+                self.failed = True
+            result = return_action(tool_use_id, output_text, error_text, None, is_error=rc != 0)
+
+        self.results.append(result)
+        return result
+
+    # with screenshot=False the batch only waits for the screen to settle
+    def finish(self, screenshot: bool = True) -> List[Dict[str, Any]]:
+        if not self.results:
+            return self.results
+
+        last = self.results[-1]
+        notes = []
+        if len(self.results) > 1:
+            notes.append(f"batch: {self.succeeded}/{len(self.results)} actions succeeded")
+        if self.last_action and not screenshot:
+            settle_after(self.last_action, self.computer)
+        elif self.last_action:
+            region = crop_region(self.inputs[-1], self.computer) if self.inputs else None
+            img, shot_out, shot_err = screenshot_after(self.last_action, self.computer, region)
+            notes += [shot_out, shot_err]
+            if img:
+                last["content"].append(image_block(img))
+        last["content"][0]["text"] = join_text(last["content"][0]["text"], *notes)
+
+        if self.computer.recorder is not None and self.inputs and not self.failed:
+            self.computer.recorder.checkpoint(self.inputs, self.computer)
+        return self.results
+
+def handle_computer_tool_uses(tool_inputs: List[Dict[str, Any]], computer: Optional[Computer] = None,
+                              screenshot: bool = True) -> List[Dict[str, Any]]:
+    batch = ActionBatch(computer)
+    for tool_input in tool_inputs:
+        batch.run(tool_input)
+    return batch.finish(screenshot)
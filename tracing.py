@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+
+import json
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional
+
+# per-turn tracing: phase timings (api, capture, encode, input, settle, ...),
+# payload bytes, token usage and action types, one JSON line per turn
+
+TOKEN_FIELDS = ["input_tokens", "output_tokens", "cache_read_input_tokens", "cache_creation_input_tokens"]
+
+def percentile(values: List[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    idx = min(len(ordered) - 1, max(0, round(pct / 100 * (len(ordered) - 1))))
+    return ordered[idx]
+
+class Tracer:
+    def __init__(self, path: Optional[str] = None):
+        self.path = path
+        self._file = open(path, "a") if path else None
+        self.records: List[Dict[str, Any]] = []
+        self.turn = 0
+        self._current = self._new_record()
+
+    def _new_record(self) -> Dict[str, Any]:
+        return {"turn": self.turn, "start": time.time(), "phases": {}, "actions": [], "tokens": {}, "bytes": {}}
+
+    @contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            phases = self._current["phases"]
+            phases[name] = phases.get(name, 0.0) + time.perf_counter() - start
+
+    def action(self, action: Optional[str]) -> None:
+        self._current["actions"].append(action)
+
+    def add_bytes(self, name: str, count: int) -> None:
+        counts = self._current["bytes"]
+        counts[name] = counts.get(name, 0) + count
+
+    def add_usage(self, usage: Any) -> None:
+        tokens = self._current["tokens"]
+        for field in TOKEN_FIELDS:
+            tokens[field] = tokens.get(field, 0) + (getattr(usage, field, None) or 0)
+
+    def end_turn(self) -> Dict[str, Any]:
+        record = self._current
+        record["duration"] = time.time() - record["start"]
+        self.records.append(record)
+        if self._file:
+            self._file.write(json.dumps(record) + "\n")
+            self._file.flush()
+        self.turn += 1
+        self._current = self._new_record()
+        return record
+
+    def close(self) -> None:
+        if self._current["phases"] or self._current["actions"]:
+            self.end_turn()
+        if self._file:
+            self._file.close()
+            self._file = None
+
+    def summary(self) -> str:
+        if not self.records:
+            return "trace: no turns recorded"
+        lines = [f"trace: {len(self.records)} turns" + (f", written to {self.path}" if self.path else "")]
+
+        names = sorted({name for record in self.records for name in record["phases"]})
+        for name in names:
+            values = [record["phases"].get(name, 0.0) for record in self.records if name in record["phases"]]
+            lines.append(f"  {name:<10} p50={percentile(values, 50):.3f}s p95={percentile(values, 95):.3f}s "
+                         f"total={sum(values):.2f}s")
+
+        totals = {field: sum(record["tokens"].get(field, 0) for record in self.records) for field in TOKEN_FIELDS}
+        lines.append("  tokens " + " ".join(f"{field}={count}" for field, count in totals.items()))
+        request_bytes = sum(record["bytes"].get("request", 0) for record in self.records)
+        image_bytes = sum(record["bytes"].get("image", 0) for record in self.records)
+        lines.append(f"  bytes request={request_bytes} image={image_bytes}")
+        return "\n".join(lines)
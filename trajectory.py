@@ -0,0 +1,170 @@
+#!/usr/bin/env python3
+
+import base64
+import hashlib
+import json
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+import batch
+import framediff
+import tool
+
+# trajectory cache: after a successful run, the action sequence is stored with
+# a fingerprint of the starting screen and a checkpoint fingerprint after each
+# step (one step = the actions of one model response). later runs with the same
+# task key and a matching starting screen replay the actions without calling
+# the model, and hand over to the model as soon as a checkpoint does not match.
+#
+# the task key must include every parameter that changes the actions (e.g. text
+# that gets typed), otherwise a replay would type another task's values
+
+DEFAULT_CACHE_DIR = "trajectories"
+# fraction of fingerprint cells allowed to differ for a checkpoint to match
+CHECKPOINT_THRESHOLD = 0.02
+# steps made only of these actions do not change the screen and are not stored
+READ_ONLY_ACTIONS = {"screenshot", "zoom", "cursor_position"}
+
+def screen_fingerprint(computer: tool.Computer) -> bytes:
+    return framediff.fingerprint(computer.capture.capture_preview())
+
+def encode_fingerprint(fingerprint: bytes) -> str:
+    return base64.b64encode(fingerprint).decode("ascii")
+
+def decode_fingerprint(text: str) -> bytes:
+    return base64.b64decode(text)
+
+class TrajectoryRecorder:
+    # attached to Computer.recorder, ActionBatch.finish reports every finished step
+    def __init__(self, start: bytes, steps: Optional[List[Dict[str, Any]]] = None):
+        self.start = start
+        self.steps: List[Dict[str, Any]] = list(steps or [])
+
+    def checkpoint(self, tool_inputs: List[Dict[str, Any]], computer: tool.Computer) -> None:
+        actions = [{key: value for key, value in tool_input.items() if key != "id"} for tool_input in tool_inputs]
+        if all(action.get("action") in READ_ONLY_ACTIONS for action in actions):
+            return
+        self.steps.append({"actions": actions, "checkpoint": encode_fingerprint(screen_fingerprint(computer))})
+
+class TrajectoryCache:
+    def __init__(self, path: str = DEFAULT_CACHE_DIR, threshold: float = CHECKPOINT_THRESHOLD):
+        self.dir = Path(path)
+        self.dir.mkdir(parents=True, exist_ok=True)
+        self.threshold = threshold
+        self.stats = {"hits": 0, "misses": 0, "fallbacks": 0, "replayed_steps": 0}
+
+    def _file(self, key: str) -> Path:
+        return self.dir / f"{hashlib.sha1(key.encode()).hexdigest()}.json"
+
+    def _load(self, key: str) -> List[Dict[str, Any]]:
+        path = self._file(key)
+        return json.loads(path.read_text()) if path.exists() else []
+
+    def matches(self, fingerprint: bytes, stored: str) -> bool:
+        return framediff.changed_fraction(fingerprint, decode_fingerprint(stored)) <= self.threshold
+
+    def lookup(self, key: str, start: bytes) -> Optional[Dict[str, Any]]:
+        for trajectory in self._load(key):
+            if self.matches(start, trajectory["start"]):
+                return trajectory
+        return None
+
+    def store(self, key: str, recorder: TrajectoryRecorder) -> None:
+        if not recorder.steps:
+            return
+        start = encode_fingerprint(recorder.start)
+        # one trajectory per starting screen, the newest run wins
+        trajectories = [t for t in self._load(key) if not self.matches(recorder.start, t["start"])]
+        trajectories.append({"key": key, "start": start, "steps": recorder.steps, "stored": time.time()})
+        self._file(key).write_text(json.dumps(trajectories))
+
+    def replay(self, trajectory: Dict[str, Any], computer: tool.Computer) -> int:
+        # returns how many steps replayed and matched their checkpoint
+        for done, step in enumerate(trajectory["steps"]):
+            results = tool.handle_computer_tool_uses(
+                [{**action, "id": f"replay_{done}_{idx}"} for idx, action in enumerate(step["actions"])],
+                computer, screenshot=False,
+            )
+            if any(result.get("is_error") for result in results):
+                return done
+            if not self.matches(screen_fingerprint(computer), step["checkpoint"]):
+                return done
+            self.stats["replayed_steps"] += 1
+        return len(trajectory["steps"])
+
+    def summary(self) -> str:
+        runs = self.stats["hits"] + self.stats["misses"] + self.stats["fallbacks"]
+        return (f"trajectory cache: {runs} runs, {self.stats['hits']} hits, {self.stats['misses']} misses, "
+                f"{self.stats['fallbacks']} fallbacks, {self.stats['replayed_steps']} steps replayed")
+
+_shared_cache: Optional[TrajectoryCache] = None
+
+def shared_cache() -> TrajectoryCache:
+    # one cache per process, so hit/miss counts add up across runs
+    global _shared_cache
+    if _shared_cache is None:
+        _shared_cache = TrajectoryCache()
+    return _shared_cache
+
+def describe_steps(steps: List[Dict[str, Any]]) -> str:
+    lines = []
+    for step in steps:
+        for action in step["actions"]:
+            details = ", ".join(f"{key}={value}" for key, value in action.items() if key != "action")
+            lines.append(f"- {action.get('action')}" + (f" ({details})" if details else ""))
+    return "\n".join(lines)
+
+# a run ending normally is not enough to cache it (the user may have typed exit,
+# or the model gave up), the model is asked to confirm success with a marker
+SUCCESS_PROMPT = f"\n\nWhen the task is done and verified, end your final message with {batch.SUCCESS_MARKER}."
+
+def task_succeeded(status: Dict[str, Any]) -> bool:
+    if status.get("stop") in ("max_turns", "timeout", "api_error"):
+        return False
+    return batch.detect_outcome(status.get("final_text", ""))[0] == "success"
+
+def run_cached(key: str, user_instructions: str, computer: Optional[tool.Computer] = None,
+               cache: Optional[TrajectoryCache] = None, success: Callable[[Dict[str, Any]], bool] = task_succeeded,
+               **loop_kwargs: Any) -> str:
+    # returns "hit", "miss" or "fallback"; the trajectory is stored only when
+    # success() passes on the loop's status (see agent.run_agent_loop)
+    import agent
+    computer = computer or tool.get_computer()
+    cache = cache or shared_cache()
+
+    start = screen_fingerprint(computer)
+    trajectory = cache.lookup(key, start)
+    recorder = TrajectoryRecorder(start)
+    instructions = user_instructions + SUCCESS_PROMPT
+    outcome = "miss"
+
+    if trajectory is not None:
+        done = cache.replay(trajectory, computer)
+        if done == len(trajectory["steps"]):
+            cache.stats["hits"] += 1
+            print(f"trajectory cache hit for {key!r}: replayed {done} steps")
+            print(cache.summary())
+            return "hit"
+
+        # keep the steps that matched, the model carries on from the current screen
+        outcome = "fallback"
+        recorder.steps = trajectory["steps"][:done]
+        if done:
+            instructions += ("\n\nNOTE: the following actions from this task were already carried out automatically:\n"
+                             + describe_steps(recorder.steps)
+                             + "\nCheck the current screen and continue from there.")
+        print(f"trajectory cache fallback for {key!r} after {done}/{len(trajectory['steps'])} steps")
+
+    computer.recorder = recorder
+    status = loop_kwargs.setdefault("status", {})
+    try:
+        completed = agent.run_agent_loop(instructions, computer, **loop_kwargs)
+    finally:
+        computer.recorder = None
+
+    cache.stats["fallbacks" if outcome == "fallback" else "misses"] += 1
+    if completed and success(status):
+        cache.store(key, recorder)
+    print(cache.summary())
+    return outcome